@@ -11,6 +11,8 @@ from app.utils.dataset_handler import DatasetHandler
 from app.utils.image_display import ImageDisplayHandler
 from app.utils.alert_handler import AlertHandler, LoadingDialog
 from app.utils.climate_data_handler import ClimateDataHandler
+from app.utils.change_analysis import write_change_analysis, year_segmentations
+from app.utils.label_cube import build_label_cube
 
 class AnalysisPageController(PageController):
     """
@@ -89,7 +91,8 @@ class AnalysisPageController(PageController):
 
     def process_climate_data(self):
         """
-        Fetch and update climate data based on the dataset's metadata.
+        Fetch and update climate data for the years of the dataset's metadata whose climate
+        data is missing or stale. metadata.json is only rewritten when something was fetched.
         Returns the updated metadata or None on error.
         """
         dataset_name = self.ui.analysisChooseCombo.currentText()
@@ -110,16 +113,13 @@ class AnalysisPageController(PageController):
 
             latitude = metadata.get("coordinates", {}).get("latitude")
             longitude = metadata.get("coordinates", {}).get("longitude")
-            years = {details["year"] for details in metadata.get("images", {}).values()}
+            years = self.climate_data_handler.stale_years(metadata)
+            if not years:
+                return metadata
 
-            # Fetch and update climate data
+            # Fetch the missing or stale years and update the metadata with them
             climate_data = self.climate_data_handler.fetch_climate_data(latitude, longitude, years)
-            self.climate_data_handler.update_metadata(dataset_path, climate_data)
-
-            # Reload and return the updated metadata
-            with open(metadata_path, "r") as updated_file:
-                updated_metadata = json.load(updated_file)
-            return updated_metadata
+            return self.climate_data_handler.update_metadata(dataset_path, climate_data, metadata)
 
         except Exception as e:
             AlertHandler.show_error(f"An error occurred while processing climate data: {e}")
@@ -308,6 +308,22 @@ class AnalysisPageController(PageController):
         )
         self.image_display_handler.create_image_widget = original_create_image_widget
 
+    def generate_change_analysis(self, dataset_path):
+        """
+        Write the transition tables, change rasters and label cube of a dataset from its
+        segmentation outputs. These need at least two segmented years and are best-effort:
+        a failure is reported and returned as a message instead of failing the analysis.
+        """
+        try:
+            if len(year_segmentations(dataset_path)) < 2:
+                return None
+            write_change_analysis(dataset_path)
+            build_label_cube(dataset_path)
+        except Exception as e:
+            print(f"Land cover change analysis failed: {e}")
+            return str(e)
+        return None
+
     def generate_analysis(self):
         """
         When the 'View Analysis' button is clicked, this method first fetches and updates
@@ -343,11 +359,17 @@ class AnalysisPageController(PageController):
                 self.plot_land_cover_climate(df, os.path.join(analysis_path, 'land_cover_climate.png'))
                 self.create_tables(df, analysis_path)
 
+                # Land cover transitions, change rasters and the label cube, if segmentations exist
+                change_analysis_error = self.generate_change_analysis(base_path)
+
                 # Save the analysis data as CSV
                 df.to_csv(os.path.join(analysis_path, "analysis_table.csv"), index=False)
 
                 self.display_analysis_results(analysis_path)
-                AlertHandler.show_info("Analysis completed successfully!")
+                message = "Analysis completed successfully!"
+                if change_analysis_error:
+                    message += f"\n\nLand cover change analysis was skipped: {change_analysis_error}"
+                AlertHandler.show_info(message)
 
             finally:
                 self.loading_dialog.close()
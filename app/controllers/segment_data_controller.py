@@ -8,8 +8,10 @@ from app.controllers.page_controller import PageController
 from app.utils.alert_handler import AlertHandler, LoadingDialog
 from app.utils.dataset_handler import DatasetHandler
 from app.utils.image_display import ImageDisplayHandler
-from app.model import generate_segmentation_maps
+from app.model import generate_segmentation_maps, model_manager
 import os
+import threading
+import time
 
 class SegmentationThread(QThread):
     """
@@ -17,16 +19,54 @@ class SegmentationThread(QThread):
 
     Args:
         dataset_path (str): Path to the dataset directory.
+        incremental (bool): Only segment images that are new or changed since the last run.
+
+    Signals:
+        progress (int, int, float): Images done, images to segment and the estimated seconds left.
+        image_ready (str, str): Path of an image and of its segmentation map, emitted as each one is written.
     """
     finished = pyqtSignal()
+    failed = pyqtSignal(str)
+    status = pyqtSignal(str)
+    progress = pyqtSignal(int, int, float)
+    image_ready = pyqtSignal(str, str)
 
-    def __init__(self, dataset_path):
+    def __init__(self, dataset_path, incremental=True):
         super().__init__()
         self.dataset_path = dataset_path
+        self.incremental = incremental
+        self._cancel = threading.Event()
+        self._start = None
+
+    def cancel(self):
+        """Stop after the images currently being segmented, keeping completed results."""
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def _on_progress(self, done, total, image_path, output_path):
+        elapsed = time.perf_counter() - self._start
+        self.progress.emit(done, total, elapsed / done * (total - done))
+        self.image_ready.emit(image_path, output_path)
 
     def run(self):
-        """Run the segmentation model on the specified dataset."""
-        generate_segmentation_maps(self.dataset_path)
+        """Wait for the model to finish loading, then run it on the specified dataset."""
+        try:
+            if not model_manager.is_ready():
+                self.status.emit("Loading segmentation model... This may take a while.")
+                model_manager.wait_until_ready()
+                self.status.emit("Running Segmentation... This may take a while.")
+
+            self._start = time.perf_counter()
+            generate_segmentation_maps(
+                self.dataset_path, incremental=self.incremental,
+                progress=self._on_progress, cancel=self._cancel
+            )
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
         self.finished.emit()
 
 class SegmentDataController(PageController):
@@ -129,13 +169,79 @@ class SegmentDataController(PageController):
         if not os.path.exists(dataset_path):
             return AlertHandler.show_error(f"Dataset directory '{dataset_path}' does not exist.")
 
-        self.loading_dialog = LoadingDialog("Running Segmentation... This may take a while.")
+        if model_manager.is_ready():
+            message = "Running Segmentation... This may take a while."
+        else:
+            message = "Loading segmentation model... This may take a while."
+        self.segmentation_thread = SegmentationThread(dataset_path)
+        self.loading_dialog = LoadingDialog(message, cancel_callback=self.cancel_segmentation)
         self.loading_dialog.show()
+        self._results_shown = False
 
-        self.segmentation_thread = SegmentationThread(dataset_path)
+        self.segmentation_thread.status.connect(self.loading_dialog.label.setText)
+        self.segmentation_thread.progress.connect(self.on_segmentation_progress)
+        self.segmentation_thread.image_ready.connect(self.on_image_segmented)
+        self.segmentation_thread.failed.connect(self.on_segmentation_failed)
         self.segmentation_thread.finished.connect(lambda: self.on_segmentation_complete(dataset_path))
         self.segmentation_thread.start()
 
+    def cancel_segmentation(self):
+        "Ask the running segmentation to stop after the images it is working on."
+
+        self.segmentation_thread.cancel()
+        self.loading_dialog.cancel_button.setEnabled(False)
+        self.loading_dialog.label.setText("Cancelling after the current images...")
+
+    def on_segmentation_progress(self, done, total, eta_seconds):
+        "Show how many images are done and the estimated time left."
+
+        self.loading_dialog.set_progress(done, total)
+        if not self.segmentation_thread.is_cancelled():
+            minutes, seconds = divmod(int(round(eta_seconds)), 60)
+            self.loading_dialog.label.setText(f"Segmented {done} of {total} images, about {minutes}m {seconds:02d}s left.")
+
+    def on_image_segmented(self, image_path, seg_map_path):
+        "Show an original/segmentation pair as soon as it has been written."
+
+        layout = self._results_layout(clear=not self._results_shown)
+        self._results_shown = True
+
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        original_path = next(
+            (path for path in self.image_paths if os.path.splitext(os.path.basename(path))[0] == image_name),
+            image_path
+        )
+        self._add_result_row(layout, original_path, seg_map_path)
+
+    def _results_layout(self, clear=True):
+        layout = self.ui.segmentScrollAreaContents.layout()
+        if layout is None:
+            layout = QVBoxLayout(self.ui.segmentScrollAreaContents)
+            self.ui.segmentScrollAreaContents.setLayout(layout)
+        elif clear:
+            self.image_display_handler.clear_layout(layout)
+        return layout
+
+    def _add_result_row(self, layout, image_path, seg_map_path=None):
+        container_widget = QWidget()
+        hbox_layout = QHBoxLayout(container_widget)
+
+        original_widget = self.image_display_handler.create_image_widget(image_path)
+        hbox_layout.addWidget(original_widget)
+
+        if seg_map_path is not None:
+            segmentation_widget = self.image_display_handler.create_image_widget(seg_map_path)
+            hbox_layout.addWidget(segmentation_widget)
+
+        layout.addWidget(container_widget)
+
+    def on_segmentation_failed(self, message):
+        "Handle errors raised while loading the model or segmenting."
+
+        self.loading_dialog.close()
+        self.ui.startSegmentButton.setEnabled(True)
+        AlertHandler.show_error(f"Segmentation failed: {message}")
+
     def on_segmentation_complete(self, dataset_path):
         " Handle post-segmentation processing."
 
@@ -154,26 +260,12 @@ class SegmentDataController(PageController):
         if not segmentation_maps:
             return AlertHandler.show_error("No segmentation maps generated.")
 
-        layout = self.ui.segmentScrollAreaContents.layout()
-        if layout is None:
-            layout = QVBoxLayout(self.ui.segmentScrollAreaContents)
-            self.ui.segmentScrollAreaContents.setLayout(layout)
-        else:
-            self.image_display_handler.clear_layout(layout)
-
+        layout = self._results_layout()
         for image_path in self.image_paths:
-            container_widget = QWidget()
-            hbox_layout = QHBoxLayout(container_widget)
-
-            original_widget = self.image_display_handler.create_image_widget(image_path)
-            hbox_layout.addWidget(original_widget)
-
             image_name = os.path.splitext(os.path.basename(image_path))[0]
-            if image_name in segmentation_maps:
-                seg_map_path = segmentation_maps[image_name]
-                segmentation_widget = self.image_display_handler.create_image_widget(seg_map_path)
-                hbox_layout.addWidget(segmentation_widget)
+            self._add_result_row(layout, image_path, segmentation_maps.get(image_name))
 
-            layout.addWidget(container_widget)
-
-        AlertHandler.show_info("Segmentation completed successfully.")
+        if self.segmentation_thread.is_cancelled():
+            AlertHandler.show_info("Segmentation cancelled. Completed images have been saved.")
+        else:
+            AlertHandler.show_info("Segmentation completed successfully.")
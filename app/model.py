@@ -1,14 +1,23 @@
-from transformers import SegformerForSemanticSegmentation, SegformerImageProcessor
+from transformers import SegformerConfig, SegformerForSemanticSegmentation, SegformerImageProcessor
 from pathlib import Path
 import numpy as np
 import glob
 from PIL import Image
 import torch
 import torch.nn.functional as F
-import pydensecrf.densecrf as dcrf
-from pydensecrf.utils import unary_from_softmax
-from collections import defaultdict, namedtuple
+from collections import namedtuple
+from itertools import islice, takewhile
+import threading
 import json
+from app.utils.crf_pool import CRF_WORKERS, CRFPool
+from app.utils.model_export import EXPORT_INPUT_SIZE, ExportedModel, find_exported_model
+from app.utils.nodata import crop, paste_labels, read_image
+from app.utils.model_store import find_local_model, load_local_model, load_local_processor
+from app.utils.pipeline import Pipeline
+from app.utils.preprocessing import ImagePreprocessor
+from app.utils.refinement import get_engine, refine_probabilities, refine_to_labels, resize_image, scaled_size
+from app.utils.segmentation_cache import CachedSegmentation, SegmentationCache, hash_file
+from app.utils.segmentation_manifest import SegmentationManifest, settings_digest
 
 
 class LandCoverClasses:
@@ -30,74 +39,544 @@ class LandCoverClasses:
         self.id2label = {lc.id: lc.name for lc in self.lc_classes}
         self.label2id = {lc.name: lc.id for lc in self.lc_classes}
         self.color_map = {lc.id: lc.color for lc in self.lc_classes}
+        self.palette = np.array([lc.color for lc in self.lc_classes], dtype=np.uint8)
 
 
 LandCoverClass = LandCoverClasses()
 
-# Load the SegFormer model
-model = SegformerForSemanticSegmentation.from_pretrained(
-    "nave1616/SegFormer-landcover-FT",
-    num_labels=LandCoverClass.num_labels,
-    id2label=LandCoverClass.id2label,
-    label2id=LandCoverClass.label2id,
-)
-
-feature_extractor = SegformerImageProcessor.from_pretrained("nvidia/segformer-b4-finetuned-ade-512-512")
-
-def generate_segmentation_maps(dataset_path):
+MODEL_ID = "nave1616/SegFormer-landcover-FT"
+PROCESSOR_ID = "nvidia/segformer-b4-finetuned-ade-512-512"
+
+ModelTier = namedtuple("ModelTier", ["name", "model_id", "processor_id", "input_size", "description"])
+
+# Speed/accuracy tiers selectable for segmentation. A tier can use another checkpoint with the
+# same land cover classes, or the same checkpoint at a smaller input size.
+MODEL_TIERS = {
+    tier.name: tier for tier in [
+        ModelTier("accurate", MODEL_ID, PROCESSOR_ID, 512, "Fine-tuned SegFormer-B4 at its training resolution."),
+        ModelTier("fast", MODEL_ID, PROCESSOR_ID, 256, "Fine-tuned SegFormer-B4 at a quarter of the input pixels, for previews."),
+    ]
+}
+DEFAULT_TIER = "accurate"
+
+
+def get_model_tier(name=None):
+    "Return the ModelTier registered under name, or the default tier."
+    name = name or DEFAULT_TIER
+    if name not in MODEL_TIERS:
+        raise ValueError(f"Unknown model tier '{name}'. Expected one of {sorted(MODEL_TIERS)}.")
+    return MODEL_TIERS[name]
+
+
+class ModelManager:
+    """
+    Loads the SegFormer model and image processor of a model tier once per session on a background thread.
+    An exported TorchScript/ONNX model for the same weights is used instead when one is active.
+    When the model has been imported into the local model store it is loaded from there,
+    memory-mapped and without network access.
+
+    Attributes:
+        tier (ModelTier): The model tier being loaded.
+        model (SegformerForSemanticSegmentation | ExportedModel): The loaded model, or None until ready.
+        feature_extractor (ImagePreprocessor): Vectorized preprocessing with the loaded processor's settings, or None until ready.
+        backend (str): 'eager' or the backend of the exported model in use.
+        error (Exception): The exception raised by the last load attempt, if any.
+    """
+
+    def __init__(self, tier=None, use_exported=True, use_store=True):
+        self.tier = get_model_tier(tier)
+        self.model = None
+        self.feature_extractor = None
+        self.backend = None
+        self.error = None
+        self.use_exported = use_exported
+        self.use_store = use_store
+        self._fingerprint = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_loading(self):
+        "Start loading in the background unless the model is loaded or already loading."
+
+        with self._lock:
+            if self.is_ready() or self.is_loading():
+                return
+
+            self.error = None
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._load, name="ModelLoader", daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        try:
+            tier = self.tier
+            stored = find_local_model(tier.model_id, tier.processor_id) if self.use_store else None
+            if stored is not None:
+                commit_hash = stored["commit_hash"]
+            else:
+                commit_hash = getattr(SegformerConfig.from_pretrained(tier.model_id), "_commit_hash", None)
+            self._fingerprint = f"{tier.model_id}@{commit_hash}"
+
+            # Exports are traced at a fixed input size
+            use_exported = self.use_exported and tier.input_size == EXPORT_INPUT_SIZE
+            exported = find_exported_model(self._fingerprint) if use_exported else None
+
+            if exported is not None:
+                path, backend, quantized = exported
+                self.model = ExportedModel(path, backend)
+                self.backend = f"{backend}-int8" if quantized else backend
+            elif stored is not None:
+                self.model = load_local_model()
+                self.backend = "eager"
+            else:
+                self.model = SegformerForSemanticSegmentation.from_pretrained(
+                    tier.model_id,
+                    num_labels=LandCoverClass.num_labels,
+                    id2label=LandCoverClass.id2label,
+                    label2id=LandCoverClass.label2id,
+                )
+                self.backend = "eager"
+
+            if stored is not None:
+                processor = load_local_processor()
+            else:
+                processor = SegformerImageProcessor.from_pretrained(tier.processor_id)
+            self.feature_extractor = ImagePreprocessor.from_processor(processor, size=tier.input_size)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._ready.set()
+
+    def is_ready(self):
+        "Return True once the model has been loaded successfully."
+        return self._ready.is_set() and self.error is None
+
+    def is_loading(self):
+        "Return True while a background load is in progress."
+        return self._thread is not None and self._thread.is_alive() and not self._ready.is_set()
+
+    def fingerprint(self):
+        "Identify the loaded weights, so cached results are dropped when the model changes."
+        return self._fingerprint or f"{self.tier.model_id}@None"
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Block until the model is loaded, starting the load if needed.
+        Returns the (model, feature_extractor) pair or raises if loading failed.
+        """
+        self.start_loading()
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Timed out waiting for the segmentation model to load.")
+        if self.error is not None:
+            raise RuntimeError(f"Failed to load segmentation model: {self.error}") from self.error
+        return self.model, self.feature_extractor
+
+
+_model_managers = {}
+
+def get_model_manager(tier=None):
+    "Return the session's ModelManager for a tier, creating it on first use."
+    tier = get_model_tier(tier)
+    if tier.name not in _model_managers:
+        _model_managers[tier.name] = ModelManager(tier.name)
+    return _model_managers[tier.name]
+
+model_manager = get_model_manager(DEFAULT_TIER)
+
+BATCH_SIZE = 4
+
+# Tiled inference for scenes too large to segment in one pass
+TILE_SIZE = 512
+TILE_OVERLAP = 64
+TILE_BLEND = "linear"
+MAX_UNTILED_SIDE = 4096
+
+# DenseCRF working resolution relative to the image, and how its result is brought back to full size
+CRF_SCALE = 1.0
+CRF_UPSAMPLE = "probabilities"
+
+# Precision of the model forward pass. "bfloat16" runs it under CPU autocast; probabilities stay float32
+PRECISIONS = ("float32", "bfloat16")
+PRECISION = "float32"
+
+# RGB colour marking no-data pixels in addition to fully transparent ones, e.g. (0, 0, 0); None disables it
+NODATA_COLOR = None
+
+# Identifies an image as it moves through the segmentation pipeline
+SegmentationJob = namedtuple("SegmentationJob", ["image_path", "image_hash", "cache_key", "region"])
+
+# Images buffered between pipeline stages
+QUEUE_SIZE = 2 * BATCH_SIZE
+
+
+def generate_segmentation_maps(dataset_path, batch_size=BATCH_SIZE, tiled=False,
+                               tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP, blend=TILE_BLEND,
+                               crf_workers=CRF_WORKERS, crf_scale=CRF_SCALE, crf_upsample=CRF_UPSAMPLE,
+                               engine=None, queue_size=QUEUE_SIZE, use_cache=True, incremental=False,
+                               progress=None, cancel=None, precision=PRECISION, tier=None,
+                               nodata_color=NODATA_COLOR):
+    """
+    Segment every image in the dataset and update metadata.json with the class frequencies.
+
+    Images stream through decode -> infer -> refine -> encode stages connected by bounded
+    queues: decoding and PNG encoding run on background threads, inference runs here and
+    DenseCRF runs in the CRF worker processes, so neighbouring images overlap in time.
+    Stage timings and queue depths are printed when the run finishes.
+
+    engine selects the refinement engine ("densecrf" or "guided"); it defaults to DenseCRF
+    when pydensecrf is installed. crf_scale runs refinement on a downscaled copy of each image
+    and probability map, and crf_upsample ("probabilities" or "labels") selects how the result
+    is upsampled.
+
+    tier selects a registered model tier ("accurate" or "fast"); the session's default model
+    is used when it is None.
+
+    precision="bfloat16" runs the model forward pass under CPU autocast; logits are converted
+    back to float32 before softmax and refinement.
+
+    No-data pixels (fully transparent, or nodata_color) are labelled background and excluded
+    from the class frequencies. Each image is cropped to the box around its valid pixels before
+    inference and refinement, tiles that are entirely no-data are skipped, and images without
+    any valid pixels are not segmented at all.
+
+    With use_cache, images whose content was already segmented with the same model and
+    settings are served from the segmentation cache and skip decoding and inference.
+
+    Every segmented image is recorded in the dataset's segmentation manifest. With incremental,
+    only images that are new, modified, were segmented with different settings or have a year
+    but no frequencies in metadata.json are processed, and the frequencies of the others are
+    left untouched.
+
+    progress(done, total, image_path, output_path) is called from a background thread as each
+    image is written. Setting the cancel event stops the run after the images already in
+    inference or refinement; their results are kept and saved to metadata.json.
+    """
     images_path = Path(dataset_path) / "images"
     segmentations_path = Path(dataset_path) / "segmentations"
     segmentations_path.mkdir(exist_ok=True)
 
     images = glob.glob(str(images_path / "*.png")) + glob.glob(str(images_path / "*.jpg"))
     updated_images = []
+    manager = get_model_manager(tier) if tier else model_manager
+    model, feature_extractor = manager.wait_until_ready()
+    refinement_engine = get_engine(engine)
+
+    cache = SegmentationCache(manager.fingerprint()) if use_cache else None
+    cache_settings = {
+        "tier": manager.tier.name,
+        "input_size": manager.tier.input_size,
+        "backend": manager.backend,
+        "precision": precision,
+        "engine": refinement_engine.name,
+        "engine_params": refinement_engine.params,
+        "crf_scale": crf_scale,
+        "crf_upsample": crf_upsample,
+        "tiled": tiled,
+        "tile_size": tile_size,
+        "tile_overlap": tile_overlap,
+        "blend": blend,
+        "max_untiled_side": MAX_UNTILED_SIDE,
+        "nodata_color": nodata_color,
+    }
+
+    manifest = SegmentationManifest(segmentations_path)
+    manifest.prune(images)
+    digest = settings_digest({"model": manager.fingerprint(), **cache_settings})
+
+    def output_path_for(image_path):
+        return segmentations_path / (Path(image_path).stem + "_seg.png")
+
+    def use_tiles(image):
+        return tiled or max(image.shape[:2]) > MAX_UNTILED_SIDE
+
+    def outputs_exist(image_path):
+        output_path = output_path_for(image_path)
+        return output_path.exists() and label_map_path(output_path).exists()
+
+    if incremental:
+        # Images whose frequencies never reached metadata.json are segmented again even if current
+        try:
+            image_entries = json.loads((Path(dataset_path) / "metadata.json").read_text()).get("images", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            image_entries = {}
+        missing_freq = {
+            name for name, image_data in image_entries.items()
+            if image_data.get("year") is not None and "freq" not in image_data
+        }
+        images = [
+            image_path for image_path in images
+            if Path(image_path).name in missing_freq
+            or not (outputs_exist(image_path) and manifest.is_current(image_path, digest, hash_file))
+        ]
+        print(f"Incremental segmentation: {len(images)} new or changed images")
+
+    def decode(image_path):
+        image_hash = hash_file(image_path)
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(image_hash, cache_settings)
+            # The label map only needs loading unless the existing outputs are of this exact image and settings
+            outputs_current = outputs_exist(image_path) and manifest.written_for(image_path, image_hash, digest)
+            cached = cache.get(cache_key, load_labels=not outputs_current)
+            if cached is not None:
+                return SegmentationJob(image_path, image_hash, cache_key, None), cached
+
+        image, region = read_image(image_path, nodata_color)
+        job = SegmentationJob(image_path, image_hash, cache_key, region)
+        if region is None:
+            return job, image
+        if region.bounds is None:
+            # Nothing to segment; handled like a cache hit with an all-background label map
+            empty = np.zeros(region.shape, dtype=np.uint8)
+            return job, CachedSegmentation([0.0] * (LandCoverClass.num_labels - 1), empty)
+        return job, np.ascontiguousarray(crop(image, region.bounds))
+
+    def encode(result):
+        (image_path, image_hash, cache_key, region), output = result
+        output_path = output_path_for(image_path)
+
+        if isinstance(output, CachedSegmentation):
+            label_freq = output.label_freq
+            if output.labels is not None:
+                save_segmentation_image(output.labels, output_path)
+                save_label_map(output.labels, label_map_path(output_path))
+        else:
+            valid_mask = None
+            if region is not None:
+                output = paste_labels(output, region)
+                valid_mask = ~region.mask
+            label_freq = calculate_class_percentages(output, Path(image_path).name, valid_mask)["label_freq"]
+            save_segmentation_image(output, output_path)
+            save_label_map(output, label_map_path(output_path))
+            if cache is not None:
+                cache.put(cache_key, output, label_freq)
+
+        updated_images.append({"image_filename": Path(image_path).name, "label_freq": label_freq})
+        manifest.record(image_path, image_hash, digest)
+        if progress is not None:
+            progress(len(updated_images), len(images), image_path, str(output_path))
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    pipeline = Pipeline()
+    decoded = pipeline.queue("decoded", queue_size)
+    refined = pipeline.queue("refined", queue_size)
+    infer_timer = pipeline.timer("infer")
+    refine_timer = pipeline.timer("refine")
+
+    pipeline.start_stage("decode", decode, takewhile(lambda _: not cancelled(), images), outbox=decoded)
+    pipeline.start_stage("encode", encode, refined)
+
+    try:
+        with torch.no_grad(), CRFPool(crf_workers, timer=refine_timer, depth=pipeline.depth("in CRF")) as crf_pool:
+            for batch in batched(decoded, batch_size):
+                # Keep draining the decode stage after a cancel so it can finish
+                if cancelled():
+                    continue
+                to_segment = [(job, image) for job, image in batch if not isinstance(image, CachedSegmentation)]
+
+                with infer_timer.measure(len(to_segment)):
+                    whole_images = [image for _, image in to_segment if not use_tiles(image)]
+                    batch_logits = iter(predict_logits(whole_images, model, feature_extractor, precision) if whole_images else [])
+
+                    for job, image in batch:
+                        if isinstance(image, CachedSegmentation):
+                            crf_pool.add_result(job, image)
+                        elif use_tiles(image):
+                            refined_output = segment_tiled(
+                                image, model, feature_extractor,
+                                tile_size=tile_size, overlap=tile_overlap, blend=blend, batch_size=batch_size,
+                                engine=refinement_engine.name, precision=precision,
+                                nodata=crop(job.region.mask, job.region.bounds) if job.region is not None else None
+                            )
+                            crf_pool.add_result(job, refined_output)
+                        else:
+                            crf_size = scaled_size(image.shape[:2], crf_scale)
+                            probabilities = upsample_probabilities(next(batch_logits), crf_size)
+                            crf_pool.submit(
+                                job, resize_image(image, crf_size), probabilities,
+                                output_size=image.shape[:2], upsample=crf_upsample, engine=refinement_engine.name
+                            )
+
+                for result in crf_pool.results():
+                    refined.put(result)
+
+            for result in crf_pool.results(wait=True):
+                refined.put(result)
+    except BaseException as e:
+        pipeline.fail(e)
+    finally:
+        refined.close()
+        try:
+            pipeline.join()
+        finally:
+            manifest.save()
 
-    with torch.no_grad():
-        for image_path in images:
-            image = Image.open(image_path).convert("RGB")
-            inputs = feature_extractor(images=image, return_tensors="pt")
-            logits = model(**inputs).logits
-
-            refined_output = apply_crf(np.array(image), logits, num_classes=LandCoverClass.num_labels)
-
-            label_freq = calculate_class_percentages(refined_output, Path(image_path).name)
-            updated_images.append(label_freq)
-
-            output_path = segmentations_path / (Path(image_path).stem + "_seg.png")
-            save_segmentation_image(refined_output, output_path)
-
+    print(pipeline.report("Segmentation"))
+    if cancelled() and len(updated_images) < len(images):
+        print(f"Segmentation cancelled after {len(updated_images)} of {len(images)} images")
     update_json_with_label_freq(updated_images, dataset_path)
 
-def apply_crf(image, logits, num_classes):
-    probabilities = F.softmax(logits, dim=1)
+def batched(items, batch_size):
+    "Yield successive lists of at most batch_size items from any iterable."
+    iterator = iter(items)
+    batch_size = max(1, int(batch_size))
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+def predict_logits(images, model, feature_extractor, precision=PRECISION):
+    """
+    Run one forward pass over a batch of PIL images or (H, W, C) arrays.
+    The preprocessor resizes every image to the same input size, so images of different
+    sizes can share a batch. Returns one (1, num_classes, h, w) float32 logits tensor per image.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Expected one of {PRECISIONS}.")
+
+    inputs = feature_extractor(images=images, return_tensors="pt")
+    with torch.autocast("cpu", dtype=torch.bfloat16, enabled=precision == "bfloat16"):
+        logits = model(**inputs).logits
+    return logits.float().split(1, dim=0)
+
+def segment_tiled(image, model, feature_extractor, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                  blend=TILE_BLEND, batch_size=BATCH_SIZE, engine=None, precision=PRECISION, nodata=None):
+    """
+    Segment an (H, W, 3) image with overlapping tiles and stitch them into one label map.
+
+    Each tile is segmented and refined at its own resolution, then blended into a buffer
+    that only covers the current row of tiles. Rows are converted to labels as soon as no
+    later tile overlaps them, so float probabilities never exist for the whole scene.
+    Tiles that are entirely no-data in the optional (H, W) nodata mask are skipped.
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError(f"Tile overlap must be in [0, {tile_size}), got {overlap}.")
+
+    num_classes = LandCoverClass.num_labels
     height, width = image.shape[:2]
-    probabilities_upsampled = F.interpolate(probabilities, size=(height, width), mode="bilinear", align_corners=False)
-    probabilities_np = probabilities_upsampled.squeeze(0).cpu().numpy()
-
-    d = dcrf.DenseCRF2D(width, height, num_classes)
-    unary = unary_from_softmax(probabilities_np)
-    d.setUnaryEnergy(np.ascontiguousarray(unary))
-
-    d.addPairwiseGaussian(sxy=(3, 3), compat=4)
-    d.addPairwiseBilateral(sxy=(3, 3), srgb=20, rgbim=image, compat=5)
+    tile_height, tile_width = min(tile_size, height), min(tile_size, width)
+    stride = tile_size - overlap
+    row_starts = _tile_starts(height, tile_height, stride)
+    col_starts = _tile_starts(width, tile_width, stride)
+    weights = _blend_weights(tile_height, tile_width, overlap, blend)
+
+    labels = np.empty((height, width), dtype=np.uint8)
+    carry = None
+
+    for row_index, y in enumerate(row_starts):
+        accumulator = np.zeros((num_classes, tile_height, width), dtype=np.float32)
+        if carry is not None:
+            accumulator[:, :carry.shape[1]] = carry
+
+        row_cols = [
+            x for x in col_starts
+            if nodata is None or not nodata[y:y + tile_height, x:x + tile_width].all()
+        ]
+        for batch_starts in batched(row_cols, batch_size):
+            tiles = [np.ascontiguousarray(image[y:y + tile_height, x:x + tile_width]) for x in batch_starts]
+            for x, tile, logits in zip(batch_starts, tiles, predict_logits(tiles, model, feature_extractor, precision)):
+                probabilities = upsample_probabilities(logits, (tile_height, tile_width))
+                refined = refine_probabilities(tile, probabilities, engine=engine)
+                accumulator[:, :, x:x + tile_width] += refined * weights
+
+        next_y = row_starts[row_index + 1] if row_index + 1 < len(row_starts) else height
+        finished_rows = next_y - y
+        labels[y:next_y] = np.argmax(accumulator[:, :finished_rows], axis=0)
+        carry = accumulator[:, finished_rows:]
+
+    return labels
+
+def _tile_starts(length, tile, stride):
+    "Return tile offsets covering [0, length), with the last tile flush against the end."
+    if length <= tile:
+        return [0]
+    return list(range(0, length - tile, stride)) + [length - tile]
+
+def _blend_weights(height, width, overlap, blend):
+    "Return the (height, width) weight applied to a tile's probabilities before stitching."
+    if blend == "uniform" or overlap == 0:
+        return np.ones((height, width), dtype=np.float32)
+    if blend != "linear":
+        raise ValueError(f"Unknown blend mode '{blend}'. Expected 'linear' or 'uniform'.")
+
+    def ramp(length):
+        distance = np.minimum(np.arange(length) + 1, length - np.arange(length))
+        return np.minimum(distance / (overlap + 1), 1.0)
+
+    return np.outer(ramp(height), ramp(width)).astype(np.float32)
+
+def upsample_probabilities(logits, size):
+    "Convert (1, C, h, w) logits to (C, H, W) float32 softmax probabilities at the given size."
+    probabilities = F.softmax(logits, dim=1)
+    probabilities_upsampled = F.interpolate(probabilities, size=size, mode="bilinear", align_corners=False)
+    return probabilities_upsampled.squeeze(0).cpu().numpy()
 
-    refined = d.inference(5)
-    return np.argmax(np.array(refined), axis=0).reshape((height, width))
+def apply_crf(image, logits, num_classes, crf_scale=1.0, upsample=CRF_UPSAMPLE, engine=None):
+    height, width = image.shape[:2]
+    crf_size = scaled_size((height, width), crf_scale)
+    probabilities = upsample_probabilities(logits, crf_size)
+    return refine_to_labels(resize_image(image, crf_size), probabilities, (height, width), upsample, engine)
 
 def save_segmentation_image(segmentation_map, output_path):
-    color_image = np.zeros((*segmentation_map.shape, 3), dtype=np.uint8)
-    for class_id, color in LandCoverClass.color_map.items():
-        color_image[segmentation_map == class_id] = color
-    Image.fromarray(color_image).save(output_path)
-
-def calculate_class_percentages(segmentation_map, image_filename):
-    class_counts = defaultdict(int)
-    total_pixels = segmentation_map.size
-
-    for class_id in range(1, LandCoverClass.num_labels):
-        class_counts[class_id] = np.sum(segmentation_map == class_id)
-
-    label_freq = [class_counts[class_id] / total_pixels for class_id in range(1, LandCoverClass.num_labels)]
+    "Write the label map as a palette-mode PNG whose palette holds the land cover colours."
+    image = Image.fromarray(np.asarray(segmentation_map, dtype=np.uint8))
+    image.putpalette(LandCoverClass.palette.ravel().tolist())
+    image.save(output_path)
+
+def label_map_path(segmentation_path):
+    "Return the path of the raw label map stored next to a _seg.png file."
+    return Path(segmentation_path).with_suffix(".npy")
+
+def save_label_map(segmentation_map, output_path):
+    "Write the label map as a uint8 .npy file that can be memory-mapped."
+    output_path = Path(output_path)
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        np.save(f, np.asarray(segmentation_map, dtype=np.uint8))
+    temp_path.replace(output_path)
+
+def load_label_map(path, mmap=True):
+    "Read a .npy label map, memory-mapped read-only unless mmap is False."
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+def colorize_segmentation(segmentation_map):
+    "Return the (H, W, 3) RGB rendering of a label map with one palette lookup."
+    return LandCoverClass.palette[segmentation_map]
+
+def load_segmentation_labels(path):
+    """
+    Read the class IDs back from a _seg.png file.
+    The raw .npy label map next to it is memory-mapped when present. Otherwise palette-mode
+    files store the IDs directly and older RGB files are mapped back through their colours.
+    """
+    labels_path = label_map_path(path)
+    if labels_path.exists():
+        return load_label_map(labels_path)
+
+    image = Image.open(path)
+    if image.mode == "P":
+        return np.array(image, dtype=np.uint8)
+
+    rgb = np.array(image.convert("RGB"), dtype=np.uint32)
+    packed = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    palette = LandCoverClass.palette.astype(np.uint32)
+    palette_packed = (palette[:, 0] << 16) | (palette[:, 1] << 8) | palette[:, 2]
+
+    order = np.argsort(palette_packed)
+    positions = np.clip(np.searchsorted(palette_packed[order], packed), 0, len(order) - 1)
+    labels = order[positions].astype(np.uint8)
+    labels[palette_packed[labels] != packed] = 0
+    return labels
+
+def calculate_class_percentages(segmentation_map, image_filename, valid_mask=None):
+    "Return the frequency of every class but background, over the valid pixels when valid_mask is given."
+    segmentation_map = np.asarray(segmentation_map)
+    values = segmentation_map.ravel() if valid_mask is None else segmentation_map[valid_mask]
+    counts = np.bincount(values, minlength=LandCoverClass.num_labels)
+    total_pixels = max(1, values.size)
+
+    label_freq = (counts[1:LandCoverClass.num_labels] / total_pixels).tolist()
     return {'image_filename': image_filename, 'label_freq': label_freq}
 
 def update_json_with_label_freq(updated_images, dataset_path):
@@ -127,13 +606,7 @@ def update_json_with_label_freq(updated_images, dataset_path):
             metadata["images"] = {}
 
         if image_filename in metadata["images"]:
-            image_data = metadata["images"][image_filename]
-            year = image_data.get("year")
-
-            metadata["images"][image_filename] = {
-                "year": year,
-                "freq": rounded_freq
-            }
+            metadata["images"][image_filename]["freq"] = rounded_freq
         else:
             print(f"Warning: No year data found for image '{image_filename}' in metadata.json.")
 
@@ -2,7 +2,7 @@
 Utility for displaying alerts in the GUI application.
 """
 
-from PyQt5.QtWidgets import QDialog, QMessageBox, QVBoxLayout, QLabel, QProgressBar
+from PyQt5.QtWidgets import QDialog, QMessageBox, QVBoxLayout, QLabel, QProgressBar, QPushButton
 from PyQt5.QtCore import Qt
 
 class AlertHandler:
@@ -25,7 +25,7 @@ class AlertHandler:
         msg.exec_()
 
 class LoadingDialog(QDialog):
-    def __init__(self, message="Loading..."):
+    def __init__(self, message="Loading...", cancel_callback=None):
         super().__init__()
         self.setWindowTitle("Please Wait")
         self.setModal(True)
@@ -35,6 +35,18 @@ class LoadingDialog(QDialog):
         self.progress.setRange(0, 0)
         layout.addWidget(self.label)
         layout.addWidget(self.progress)
+
+        self.cancel_button = None
+        if cancel_callback is not None:
+            self.cancel_button = QPushButton("Cancel")
+            self.cancel_button.clicked.connect(cancel_callback)
+            layout.addWidget(self.cancel_button)
+
         self.setLayout(layout)
-        self.setFixedSize(300, 100)
-        self.setWindowFlags(self.windowFlags() | Qt.CustomizeWindowHint | Qt.WindowTitleHint)
\ No newline at end of file
+        self.setFixedSize(300, 100 if cancel_callback is None else 140)
+        self.setWindowFlags(self.windowFlags() | Qt.CustomizeWindowHint | Qt.WindowTitleHint)
+
+    def set_progress(self, done, total):
+        """Switch from the busy indicator to a progress bar showing done out of total."""
+        self.progress.setRange(0, max(1, total))
+        self.progress.setValue(done)
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""
+Utility for locating the per-user application data directory.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+APP_NAME = "Microclimate Analysis Tool"
+
+
+def get_app_data_dir(*parts):
+    """
+    Return a directory inside the per-user application data directory, creating it if needed.
+    The location can be overridden with the MICROCLIMATE_DATA_DIR environment variable.
+    """
+    base = os.environ.get("MICROCLIMATE_DATA_DIR")
+    if not base:
+        if sys.platform == "win32":
+            base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / APP_NAME
+        elif sys.platform == "darwin":
+            base = Path.home() / "Library" / "Application Support" / APP_NAME
+        else:
+            base = Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share")) / APP_NAME
+
+    path = Path(base).joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,120 @@
+"""
+Utility for measuring land cover transitions between segmentations of the same site.
+"""
+
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+TRANSITION_BLOCK_ROWS = 512
+UNCHANGED_COLOR = (64, 64, 64)
+
+
+def transition_matrix(labels_from, labels_to, num_classes, block_rows=TRANSITION_BLOCK_ROWS, change_raster=None):
+    """
+    Count the pixels that move from each class in labels_from to each class in labels_to.
+
+    Both (H, W) label maps are read a block of rows at a time and every block is counted with
+    one bincount over the transition codes from * num_classes + to, so memory-mapped label maps
+    of any size are processed in bounded memory. labels_to is resampled to the shape of
+    labels_from with nearest neighbour when the two differ.
+
+    If change_raster, an (H, W) uint8 array such as a memmap, is given it receives the
+    transition code of every pixel. Returns (num_classes, num_classes) int64 counts with the
+    earlier class on the rows.
+    """
+    if num_classes ** 2 > 256:
+        raise ValueError("Transition codes only fit in uint8 for up to 16 classes.")
+
+    shape = labels_from.shape
+    counts = np.zeros(num_classes ** 2, dtype=np.int64)
+    for top in range(0, shape[0], block_rows):
+        bottom = min(top + block_rows, shape[0])
+        block_from = read_rows(labels_from, shape, top, bottom)
+        codes = block_from * np.uint8(num_classes) + read_rows(labels_to, shape, top, bottom)
+        counts += np.bincount(codes.ravel(), minlength=num_classes ** 2)
+        if change_raster is not None:
+            change_raster[top:bottom] = codes
+
+    return counts.reshape(num_classes, num_classes)
+
+def read_rows(labels, shape, top, bottom):
+    """
+    Return rows top:bottom of a label map resampled with nearest neighbour to shape (H, W)
+    as uint8. Only the source rows needed are read, so memory-mapped maps stay on disk.
+    """
+    height, width = shape
+    source_height, source_width = labels.shape
+    if (source_height, source_width) == (height, width):
+        return np.asarray(labels[top:bottom], dtype=np.uint8)
+    rows = labels[np.arange(top, bottom) * source_height // height]
+    return np.asarray(rows[:, np.arange(width) * source_width // width], dtype=np.uint8)
+
+def year_segmentations(dataset_path):
+    "Return (year, _seg.png path) of every segmented image in a dataset, sorted by year."
+    dataset_path = Path(dataset_path)
+    metadata = json.loads((dataset_path / "metadata.json").read_text())
+
+    segmentations = []
+    for image_name, image_data in metadata.get("images", {}).items():
+        segmentation_path = dataset_path / "segmentations" / f"{Path(image_name).stem}_seg.png"
+        if segmentation_path.exists() and image_data.get("year") is not None:
+            segmentations.append((int(image_data["year"]), segmentation_path))
+    return sorted(segmentations)
+
+def change_preview(change_raster, palette, block_rows=TRANSITION_BLOCK_ROWS):
+    """
+    Return a palette-mode image of a change raster: changed pixels in the colour of their
+    new class, unchanged pixels in UNCHANGED_COLOR.
+    """
+    num_classes = len(palette)
+    indices = np.empty(change_raster.shape, dtype=np.uint8)
+    for top in range(0, change_raster.shape[0], block_rows):
+        codes = np.asarray(change_raster[top:top + block_rows])
+        from_class, to_class = np.divmod(codes, num_classes)
+        indices[top:top + block_rows] = np.where(from_class == to_class, num_classes, to_class)
+
+    image = Image.fromarray(indices)
+    image.putpalette(np.vstack([palette, UNCHANGED_COLOR]).astype(np.uint8).ravel().tolist())
+    return image
+
+def write_change_analysis(dataset_path, block_rows=TRANSITION_BLOCK_ROWS):
+    """
+    Compare the segmentations of consecutive years in a dataset and write, for every pair,
+    into its analysis folder:
+    - transitions_<from>_<to>.csv: pixel counts from each class (rows) to each class (columns)
+    - change_<from>_<to>.npy: uint8 raster of transition codes from * num_classes + to
+    - change_<from>_<to>.png: preview of the pixels whose class changed
+    Returns the paths of the written transition tables.
+    """
+    from app.model import LandCoverClass, load_segmentation_labels
+
+    dataset_path = Path(dataset_path)
+    analysis_path = dataset_path / "analysis"
+    analysis_path.mkdir(exist_ok=True)
+    segmentations = year_segmentations(dataset_path)
+
+    names = [lc.name for lc in LandCoverClass.lc_classes]
+    tables = []
+    for (year_from, path_from), (year_to, path_to) in zip(segmentations, segmentations[1:]):
+        labels_from = load_segmentation_labels(path_from)
+        stem = f"{year_from}_{year_to}"
+
+        change_raster = np.lib.format.open_memmap(
+            analysis_path / f"change_{stem}.npy", mode="w+", dtype=np.uint8, shape=labels_from.shape
+        )
+        counts = transition_matrix(
+            labels_from, load_segmentation_labels(path_to), LandCoverClass.num_labels, block_rows, change_raster
+        )
+        change_raster.flush()
+        change_preview(change_raster, LandCoverClass.palette, block_rows).save(analysis_path / f"change_{stem}.png")
+        del change_raster
+
+        table = pd.DataFrame(counts, index=pd.Index(names, name=f"{year_from} \\ {year_to}"), columns=names)
+        table_path = analysis_path / f"transitions_{stem}.csv"
+        table.to_csv(table_path)
+        tables.append(table_path)
+
+    return tables
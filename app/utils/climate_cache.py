@@ -0,0 +1,107 @@
+"""
+Utility for caching climate archive responses on disk.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from app.utils.app_data import get_app_data_dir
+
+CLIMATE_CACHE_MAX_BYTES = 256 * 1024 ** 2
+COORDINATE_DECIMALS = 2
+
+
+class ClimateCache:
+    """
+    Stores the raw daily or hourly arrays of archive responses in an SQLite database, keyed by
+    the coordinates rounded to COORDINATE_DECIMALS, the date range, the frequency and the
+    parameter set.
+
+    Responses are stored as compressed JSON. When the cache grows past max_bytes the least
+    recently used responses are removed. The cache can be shared by several threads.
+
+    Args:
+        directory (str): Cache directory. Defaults to 'cache/climate' in the app data directory.
+        max_bytes (int): Size limit of the stored responses.
+    """
+
+    def __init__(self, directory=None, max_bytes=CLIMATE_CACHE_MAX_BYTES):
+        self.directory = Path(directory) if directory else get_app_data_dir("cache", "climate")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.directory / "climate.sqlite", check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, request TEXT NOT NULL, body BLOB NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(latitude, longitude, start_date, end_date, frequency, params):
+        "Return the cache key and the normalized request it was derived from."
+        request = {
+            "latitude": round(float(latitude), COORDINATE_DECIMALS),
+            "longitude": round(float(longitude), COORDINATE_DECIMALS),
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "frequency": frequency,
+            "params": sorted(params),
+        }
+        encoded = json.dumps(request, sort_keys=True)
+        return hashlib.sha256(encoded.encode()).hexdigest(), encoded
+
+    def get(self, key):
+        "Return the response arrays stored under key, or None."
+        with self._lock:
+            row = self._connection.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, request, data):
+        "Store the response arrays under key, evicting old responses if needed."
+        body = zlib.compress(json.dumps(data).encode())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, request, body, len(body), time.time()),
+            )
+            self._evict()
+
+    def size(self):
+        "Return the total size of the stored responses in bytes."
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def evict(self):
+        "Remove least recently used responses until the cache fits in max_bytes."
+        with self._lock, self._connection:
+            self._evict()
+
+    def clear(self):
+        "Remove every cached response."
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        self._connection.close()
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
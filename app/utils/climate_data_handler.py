@@ -1,9 +1,39 @@
 import requests
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from requests.adapters import HTTPAdapter
+from app.utils.climate_cache import ClimateCache
+from app.utils.request_scheduler import RequestScheduler
+
+# Serve climate data only from the cache, without network access
+CLIMATE_OFFLINE = os.environ.get("MICROCLIMATE_OFFLINE") == "1"
+
+
+class ClimateDataUnavailable(requests.exceptions.RequestException):
+    "Raised in offline mode when a response is not in the cache."
+
 
 class ClimateDataHandler:
+    """
+    Fetches yearly climate aggregates from the Open-Meteo archive API.
+
+    Requests go through one pooled requests.Session and independent requests are sent
+    concurrently from a thread pool, within the archive's rate limit and with retries of
+    throttled or failed requests. Responses for past years, which the archive no longer
+    changes, are kept in a ClimateCache so repeated analyses need no network access.
+
+    Args:
+        max_workers (int): Maximum number of requests in flight at once.
+        session (requests.Session): Session to send requests with, a pooled one by default.
+        scheduler (RequestScheduler): Rate limiter and retry policy, a default one for the session if None.
+        cache (ClimateCache): Response cache. Defaults to the one in the app data directory.
+        use_cache (bool): Whether to read and store responses in the cache.
+        offline (bool): Serve responses only from the cache and never send requests.
+    """
     BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
+    MAX_CONCURRENT_REQUESTS = 4
 
     DAILY_PARAMS = [
         "temperature_2m_max",
@@ -25,61 +55,173 @@ class ClimateDataHandler:
         "direct_radiation",
     ]
 
+    def __init__(self, max_workers=MAX_CONCURRENT_REQUESTS, session=None, scheduler=None, cache=None,
+                 use_cache=True, offline=CLIMATE_OFFLINE):
+        if offline and not use_cache:
+            raise ValueError("Offline mode needs the climate cache.")
+        self.max_workers = max(1, max_workers)
+        self.session = session or self.create_session(self.max_workers)
+        self.scheduler = scheduler or RequestScheduler(self.session)
+        self.cache = (cache or ClimateCache()) if use_cache else None
+        self.offline = offline
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="climate")
+
+    @staticmethod
+    def create_session(pool_size):
+        "Return a session that keeps up to pool_size connections to the archive open for reuse."
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def fetch_climate_data(self, latitude, longitude, years):
-        climate_data = {}
+        """
+        Fetch the whole span from the earliest to the latest year with one daily and one hourly
+        request and return the mean of every parameter per requested year.
+        """
+        return self.fetch_locations([(latitude, longitude, years)])[0]
+
+    def fetch_locations(self, locations):
+        """
+        Fetch the climate data of several (latitude, longitude, years) locations and return
+        their per-year dictionaries in the same order. The requests of all locations are sent
+        concurrently, at most max_workers at a time.
+        """
+        pending = []
+        for latitude, longitude, years in locations:
+            years = sorted(years, key=int)
+            futures = None
+            if years:
+                # 🌍 Fetch Daily and ⏱️ Hourly Data
+                futures = [
+                    self._executor.submit(self._fetch_range, latitude, longitude, years[0], years[-1], frequency, params)
+                    for frequency, params in (("daily", self.DAILY_PARAMS), ("hourly", self.HOURLY_PARAMS))
+                ]
+            pending.append((years, futures))
+
+        return [self._aggregate(years, futures) if futures else {} for years, futures in pending]
+
+    def _aggregate(self, years, futures):
+        "Wait for the daily and hourly responses of a location and average them per year."
+        try:
+            daily_data, hourly_data = (future.result() for future in futures)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching data for years {years[0]}-{years[-1]}: {e}")
+            return {year: {param: None for param in (self.DAILY_PARAMS + self.HOURLY_PARAMS)} for year in years}
+
+        daily_by_year = self.split_by_year(daily_data, self.DAILY_PARAMS)
+        hourly_by_year = self.split_by_year(hourly_data, self.HOURLY_PARAMS)
 
+        climate_data = {}
         for year in years:
             year_data = {}
+            daily_year = daily_by_year.get(int(year), {})
+            for param in self.DAILY_PARAMS:
+                year_data[param] = self.safe_mean(daily_year.get(param, []))
 
-            try:
-                # 🌍 Fetch Daily Data
-                daily_response = requests.get(self.BASE_URL, params={
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "start_date": f"{year}-01-01",
-                    "end_date": f"{year}-12-31",
-                    "daily": ",".join(self.DAILY_PARAMS),
-                    "timezone": "auto"
-                })
-                daily_response.raise_for_status()
-                daily_data = daily_response.json().get("daily", {})
-
-                # ⏱️ Fetch Hourly Data
-                hourly_response = requests.get(self.BASE_URL, params={
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "start_date": f"{year}-01-01",
-                    "end_date": f"{year}-12-31",
-                    "hourly": ",".join(self.HOURLY_PARAMS),
-                    "timezone": "auto"
-                })
-                hourly_response.raise_for_status()
-                hourly_data = hourly_response.json().get("hourly", {})
-
-                def safe_mean(values):
-                    valid = [v for v in values if v is not None]
-                    return sum(valid) / len(valid) if valid else None
-
-                for param in self.DAILY_PARAMS:
-                    year_data[param] = safe_mean(daily_data.get(param, []))
-
-                # Aggregate Hourly Data
-                for param in self.HOURLY_PARAMS:
-                    year_data[param] = safe_mean(hourly_data.get(param, []))
-
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching data for year {year}: {e}")
-                year_data = {param: None for param in (self.DAILY_PARAMS + self.HOURLY_PARAMS)}
+            # Aggregate Hourly Data
+            hourly_year = hourly_by_year.get(int(year), {})
+            for param in self.HOURLY_PARAMS:
+                year_data[param] = self.safe_mean(hourly_year.get(param, []))
 
             climate_data[year] = year_data
 
         return climate_data
 
-    def update_metadata(self, dataset_path, climate_data):
+    def _fetch_range(self, latitude, longitude, start_year, end_year, frequency, params):
+        """
+        Return the 'daily' or 'hourly' block of the archive response for whole years start_year
+        to end_year, from the cache when possible. Only ranges ending before the current year
+        are cached, as the archive still adds data for the current one.
+        """
+        start_date, end_date = f"{start_year}-01-01", f"{end_year}-12-31"
+        cacheable = self.cache is not None and int(end_year) < date.today().year
+        if cacheable:
+            key, request = self.cache.key(latitude, longitude, start_date, end_date, frequency, params)
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+        if self.offline:
+            raise ClimateDataUnavailable(f"No cached {frequency} data for {start_date} to {end_date} in offline mode")
+
+        response = self.scheduler.get(self.BASE_URL, params={
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": start_date,
+            "end_date": end_date,
+            frequency: ",".join(params),
+            "timezone": "auto"
+        })
+        response.raise_for_status()
+        data = response.json().get(frequency, {})
+        if cacheable:
+            self.cache.put(key, request, data)
+        return data
+
+    @staticmethod
+    def split_by_year(data, params):
+        "Split the value arrays of a response block into {year: {param: values}} using its ISO 'time' array."
+        by_year = {}
+        times = data.get("time", [])
+        for index, timestamp in enumerate(times):
+            year = int(timestamp[:4])
+            if year not in by_year:
+                by_year[year] = (index, index)
+            by_year[year] = (by_year[year][0], index + 1)
+
+        return {
+            year: {param: data.get(param, [])[start:stop] for param in params}
+            for year, (start, stop) in by_year.items()
+        }
+
+    @staticmethod
+    def safe_mean(values):
+        valid = [v for v in values if v is not None]
+        return sum(valid) / len(valid) if valid else None
+
+    def climate_record(self):
+        "Return the description of the current climate data: its parameters, source and fetch time."
+        return {
+            "params": self.DAILY_PARAMS + self.HOURLY_PARAMS,
+            "source": self.BASE_URL,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def is_fresh(self, details):
+        """
+        Return True if an image entry holds climate data fetched with the current parameters and
+        source after its year ended, so that the archive will not return different values.
+        """
+        record = details.get("climate_record")
+        if not record or "climate" not in details:
+            return False
+        if record.get("params") != self.DAILY_PARAMS + self.HOURLY_PARAMS or record.get("source") != self.BASE_URL:
+            return False
+        try:
+            return datetime.fromisoformat(record["fetched_at"]).year > int(details["year"])
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    def stale_years(self, metadata):
+        "Return the years of image entries whose climate data is missing or stale."
+        return {
+            details["year"] for details in metadata.get("images", {}).values()
+            if details.get("year") and not self.is_fresh(details)
+        }
+
+    def update_metadata(self, dataset_path, climate_data, metadata=None):
+        """
+        Write the climate data of every year into the image entries of metadata.json and return
+        the updated metadata. Years whose fetch failed are left without a climate record so they
+        are fetched again next time.
+        """
         metadata_path = os.path.join(dataset_path, "metadata.json")
-        with open(metadata_path, "r") as file:
-            metadata = json.load(file)
+        if metadata is None:
+            with open(metadata_path, "r") as file:
+                metadata = json.load(file)
 
+        record = self.climate_record()
         for image, details in metadata.get("images", {}).items():
             year = details.get("year")
             if year and year in climate_data:
@@ -88,8 +230,11 @@ class ClimateDataHandler:
                     k: round(v, 4) if isinstance(v, float) else v
                     for k, v in climate_data[year].items()
                 }
+                if any(v is not None for v in climate_data[year].values()):
+                    details["climate_record"] = record
+                else:
+                    details.pop("climate_record", None)
 
         with open(metadata_path, "w") as file:
             json.dump(metadata, file, indent=4)
-
-
+        return metadata
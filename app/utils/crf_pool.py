@@ -0,0 +1,185 @@
+"""
+Utility for running probability refinement (DenseCRF or another engine) in worker processes.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+from app.utils.refinement import refine_to_labels
+
+CRF_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Spawned workers re-import the application on start-up, so they are kept for the session
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers):
+    "Return the session-wide CRF worker pool, recreating it if the worker count changed."
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+def shutdown_workers():
+    "Stop the session-wide CRF worker pool."
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+class CRFPool:
+    """
+    Refines segmentation probabilities in worker processes while the caller keeps running inference.
+
+    Images, probabilities and output labels are exchanged through shared memory blocks, so the
+    arrays are never pickled. Results are yielded in submission order. The worker processes
+    are shared by every pool with the same worker count.
+
+    Args:
+        workers (int): Number of worker processes. 0 refines in the calling process.
+        max_pending (int): Images allowed in flight before results() waits for the oldest one.
+        timer (StageTimer): Optional timer credited with the refinement time of every image.
+        depth (QueueDepth): Optional statistics recording how many images are in flight.
+    """
+
+    def __init__(self, workers=CRF_WORKERS, max_pending=None, timer=None, depth=None):
+        self.workers = workers
+        self.max_pending = max_pending or 2 * max(1, workers)
+        self.timer = timer
+        self.depth = depth
+        self._executor = get_executor(workers) if workers > 0 else None
+        self._pending = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key, image, probabilities, output_size=None, upsample="probabilities", engine=None):
+        """
+        Queue an (h, w, 3) uint8 image and its (C, h, w) probabilities for refinement with engine.
+        The labels are upsampled to output_size when the CRF runs at a reduced resolution.
+        """
+        output_size = tuple(output_size or image.shape[:2])
+
+        if self._executor is None:
+            start = time.perf_counter()
+            labels = refine_to_labels(image, probabilities, output_size, upsample, engine)
+            self._record_time(time.perf_counter() - start)
+            return self.add_result(key, labels)
+
+        blocks = []
+        try:
+            image_spec = _share(np.ascontiguousarray(image, dtype=np.uint8), blocks)
+            probabilities_spec = _share(np.ascontiguousarray(probabilities, dtype=np.float32), blocks)
+            labels_spec = _allocate(output_size, np.uint8, blocks)
+            future = self._executor.submit(
+                _refine_shared, image_spec, probabilities_spec, labels_spec, upsample, engine
+            )
+        except BaseException:
+            _release(blocks)
+            raise
+        self._pending.append((key, future, labels_spec, blocks))
+        if self.depth is not None:
+            self.depth.record(len(self._pending))
+
+    def add_result(self, key, labels):
+        "Queue an already refined label map so it is yielded in submission order."
+        self._pending.append((key, None, labels, []))
+
+    def results(self, wait=False):
+        """
+        Yield (key, labels) pairs in submission order.
+        Stops at the first unfinished image unless wait is True or too many images are in flight.
+        """
+        while self._pending:
+            key, future, labels, blocks = self._pending[0]
+            if future is not None:
+                if not (wait or future.done() or len(self._pending) > self.max_pending):
+                    return
+                try:
+                    self._record_time(future.result())
+                    labels = _read(labels, blocks)
+                finally:
+                    _release(blocks)
+            self._pending.popleft()
+            yield key, labels
+
+    def _record_time(self, seconds):
+        if self.timer is not None:
+            self.timer.seconds += seconds
+            self.timer.items += 1
+
+    def close(self):
+        "Cancel unfinished refinements and free any shared memory still in use."
+
+        while self._pending:
+            _, future, _, blocks = self._pending.popleft()
+            if future is not None:
+                future.cancel()
+            _release(blocks)
+
+
+def _allocate(shape, dtype, blocks):
+    "Create a shared memory block for an array and return its (name, shape, dtype) spec."
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape)) * dtype.itemsize
+    block = shared_memory.SharedMemory(create=True, size=max(1, size))
+    blocks.append(block)
+    return block.name, tuple(shape), dtype.str
+
+def _share(array, blocks):
+    "Copy an array into a new shared memory block and return its spec."
+    spec = _allocate(array.shape, array.dtype, blocks)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=blocks[-1].buf)[...] = array
+    return spec
+
+def _read(spec, blocks):
+    "Copy the array described by spec out of its shared memory block."
+    name, shape, dtype = spec
+    block = next(block for block in blocks if block.name == name)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+
+def _release(blocks):
+    for block in blocks:
+        block.close()
+        block.unlink()
+    blocks.clear()
+
+def _refine_shared(image_spec, probabilities_spec, labels_spec, upsample, engine):
+    """
+    Worker entry point: refine the shared probabilities and write labels into shared memory.
+    Returns the time spent refining.
+    """
+    start = time.perf_counter()
+    specs = (image_spec, probabilities_spec, labels_spec)
+    blocks = [shared_memory.SharedMemory(name=spec[0]) for spec in specs]
+    arrays = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for (_, shape, dtype), block in zip(specs, blocks)]
+    try:
+        image, probabilities, labels = arrays
+        labels[...] = refine_to_labels(image, probabilities, labels.shape, upsample, engine)
+        return time.perf_counter() - start
+    finally:
+        image = probabilities = labels = None
+        arrays.clear()
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # A traceback still references a view; the mapping is freed with the worker
+                pass
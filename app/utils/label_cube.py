@@ -0,0 +1,144 @@
+"""
+Utility for stacking a dataset's yearly segmentations into a chunked year x rows x cols label cube.
+
+The cube is stored in the dataset's analysis/label_cube directory as one uint8 .npy file per
+spatial chunk holding every year of that chunk, plus a cube.json index. Per-pixel trajectories
+are computed one memory-mapped chunk at a time, so the full stack is never loaded.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+from app.utils.change_analysis import read_rows, year_segmentations
+
+CUBE_DIRECTORY = "label_cube"
+CUBE_INDEX = "cube.json"
+CHUNK_SIZE = 256
+
+# Class IDs counted as urban: Developed Space, Road and Building
+URBAN_CLASSES = (3, 4, 8)
+
+
+class LabelCube:
+    """
+    Read access to a label cube written by build_label_cube.
+
+    Args:
+        path (str): The label cube directory.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        index = json.loads((self.path / CUBE_INDEX).read_text())
+        self.years = index["years"]
+        self.shape = tuple(index["shape"])
+        self.chunk_size = index["chunk_size"]
+        self.sources = index["sources"]
+
+    def chunk_path(self, top, left):
+        return self.path / f"chunk_{top}_{left}.npy"
+
+    def chunks(self):
+        "Yield ((top, left), chunk) for every chunk, chunk being a memory-mapped (years, h, w) array."
+        height, width = self.shape
+        for top in range(0, height, self.chunk_size):
+            for left in range(0, width, self.chunk_size):
+                yield (top, left), np.load(self.chunk_path(top, left), mmap_mode="r")
+
+    def trajectory(self, row, column):
+        "Return the class of one pixel in every year."
+        top, left = row - row % self.chunk_size, column - column % self.chunk_size
+        chunk = np.load(self.chunk_path(top, left), mmap_mode="r")
+        return np.array(chunk[:, row - top, column - left])
+
+    def map_chunks(self, function, dtype):
+        "Return the (H, W) array of function applied to every (years, h, w) chunk."
+        output = np.empty(self.shape, dtype=dtype)
+        for (top, left), chunk in self.chunks():
+            output[top:top + chunk.shape[1], left:left + chunk.shape[2]] = function(np.asarray(chunk))
+        return output
+
+    def first_year_urbanized(self, urban_classes=URBAN_CLASSES):
+        "Return the first year each pixel is an urban class, 0 where it never is."
+        years = np.asarray(self.years, dtype=np.int16)
+
+        def first_year(chunk):
+            urban = np.isin(chunk, urban_classes)
+            return np.where(urban.any(axis=0), years[urban.argmax(axis=0)], 0)
+
+        return self.map_chunks(first_year, np.int16)
+
+    def class_changes(self):
+        "Return the number of times each pixel's class changes between consecutive years."
+        return self.map_chunks(lambda chunk: (chunk[1:] != chunk[:-1]).sum(axis=0), np.uint8)
+
+
+def cube_path(dataset_path):
+    return Path(dataset_path) / "analysis" / CUBE_DIRECTORY
+
+def build_label_cube(dataset_path, chunk_size=CHUNK_SIZE):
+    """
+    Write the label cube of a dataset from its segmentation label maps and return it.
+
+    Years are ordered by year, and maps whose size differs from the earliest one are resampled
+    to it with nearest neighbour. The cube is read one band of chunk_size rows at a time, and
+    is rebuilt only when a label map changed since it was written.
+    """
+    from app.model import label_map_path, load_segmentation_labels
+
+    segmentations = year_segmentations(dataset_path)
+    if not segmentations:
+        raise ValueError("The dataset has no segmented images with a year.")
+
+    sources = {}
+    for year, segmentation_path in segmentations:
+        labels_path = label_map_path(segmentation_path)
+        source_path = labels_path if labels_path.exists() else segmentation_path
+        sources[source_path.name] = os.stat(source_path).st_mtime_ns
+
+    path = cube_path(dataset_path)
+    try:
+        cube = LabelCube(path)
+        if cube.sources == sources and cube.chunk_size == chunk_size:
+            return cube
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    temp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(temp_path, ignore_errors=True)
+    temp_path.mkdir(parents=True)
+
+    # Label maps are memory-mapped; maps only stored as PNG are decoded one at a time into a
+    # temporary .npy so the stack of years is never held in memory
+    label_maps = []
+    for position, (_, segmentation_path) in enumerate(segmentations):
+        labels_path = label_map_path(segmentation_path)
+        if not labels_path.exists():
+            labels_path = temp_path / f"labels_{position}.npy"
+            np.save(labels_path, load_segmentation_labels(segmentation_path))
+        label_maps.append(np.load(labels_path, mmap_mode="r"))
+    height, width = shape = label_maps[0].shape
+
+    for top in range(0, height, chunk_size):
+        bottom = min(top + chunk_size, height)
+        band = np.stack([read_rows(labels, shape, top, bottom) for labels in label_maps])
+        for left in range(0, width, chunk_size):
+            np.save(temp_path / f"chunk_{top}_{left}.npy", np.ascontiguousarray(band[:, :, left:left + chunk_size]))
+
+    index = {
+        "years": [year for year, _ in segmentations],
+        "shape": list(shape),
+        "chunk_size": chunk_size,
+        "sources": sources,
+    }
+    (temp_path / CUBE_INDEX).write_text(json.dumps(index, indent=4))
+
+    del label_maps
+    for labels_path in temp_path.glob("labels_*.npy"):
+        labels_path.unlink()
+
+    shutil.rmtree(path, ignore_errors=True)
+    temp_path.replace(path)
+    return LabelCube(path)
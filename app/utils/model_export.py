@@ -0,0 +1,198 @@
+"""
+Utility for exporting the segmentation model to TorchScript or ONNX Runtime for faster CPU inference.
+
+Export once with:
+    python -m app.utils.model_export --backend onnx --quantize
+
+The exported model is stored in the app data directory and used automatically on the next start.
+Run with --disable to go back to the eager PyTorch model.
+"""
+
+import argparse
+import json
+import re
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+import torch
+from app.utils.app_data import get_app_data_dir
+
+BACKENDS = ("torchscript", "onnx")
+EXPORT_INPUT_SIZE = 512
+ONNX_OPSET = 17
+# An export is only activated if it reproduces the eager logits on a sample input within
+# EXPORT_TOLERANCE, or for int8 exports agrees with the eager argmax on this share of pixels
+EXPORT_TOLERANCE = 1e-3
+QUANTIZED_MIN_AGREEMENT = 0.9
+
+
+class _LogitsOnly(torch.nn.Module):
+    "Wraps the Hugging Face model so tracing sees a plain tensor in, tensor out function."
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+
+class ExportedModel:
+    """
+    Runs an exported model behind the same interface as the Hugging Face model,
+    so model(pixel_values=...).logits works for either.
+
+    Args:
+        path (str): Path of the exported artifact.
+        backend (str): 'torchscript' or 'onnx'.
+    """
+
+    def __init__(self, path, backend):
+        self.path = Path(path)
+        self.backend = backend
+
+        if backend == "torchscript":
+            self._module = torch.jit.load(str(self.path), map_location="cpu").eval()
+        elif backend == "onnx":
+            onnxruntime = _import_onnxruntime()
+            self._session = onnxruntime.InferenceSession(str(self.path), providers=["CPUExecutionProvider"])
+        else:
+            raise ValueError(f"Unknown export backend '{backend}'. Expected one of {BACKENDS}.")
+
+    def __call__(self, pixel_values, **kwargs):
+        if self.backend == "torchscript":
+            logits = self._module(pixel_values)
+        else:
+            outputs = self._session.run(None, {"pixel_values": pixel_values.cpu().numpy().astype(np.float32)})
+            logits = torch.from_numpy(outputs[0])
+        return SimpleNamespace(logits=logits)
+
+
+def export_directory():
+    return get_app_data_dir("models", "exported")
+
+def artifact_path(fingerprint, backend, quantize, directory=None):
+    "Return the file an export of the given model, backend and quantization is stored in."
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown export backend '{backend}'. Expected one of {BACKENDS}.")
+
+    name = re.sub(r"[^\w.-]", "_", fingerprint)
+    suffix = ".pt" if backend == "torchscript" else ".onnx"
+    return Path(directory or export_directory()) / f"{name}-{backend}{'-int8' if quantize else ''}{suffix}"
+
+def export_model(model, fingerprint, backend="onnx", quantize=False, directory=None, activate=True):
+    """
+    Export the eager model to TorchScript or ONNX, optionally with dynamic int8 quantization
+    of its linear layers, and return the artifact path. The export is checked against the
+    eager model with verify_export and deleted with a RuntimeError if it does not match.
+    With activate, the export is recorded as the one to load for this model fingerprint.
+    """
+    path = artifact_path(fingerprint, backend, quantize, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A batch of 2 keeps the ONNX exporter from specializing the batch dimension to 1
+    example = torch.zeros((2, 3, EXPORT_INPUT_SIZE, EXPORT_INPUT_SIZE))
+    model = model.eval()
+
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+
+        if backend == "torchscript":
+            traced_model = model
+            if quantize:
+                traced_model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            traced = torch.jit.trace(_LogitsOnly(traced_model).eval(), example, check_trace=False)
+            torch.jit.save(traced, str(path))
+        else:
+            fp32_path = path.with_name(path.name.replace("-int8", "")) if quantize else path
+            torch.onnx.export(
+                _LogitsOnly(model).eval(), (example,), str(fp32_path),
+                input_names=["pixel_values"], output_names=["logits"],
+                dynamic_shapes={"pixel_values": {0: torch.export.Dim("batch", min=1)}},
+                opset_version=ONNX_OPSET, dynamo=True,
+            )
+            if quantize:
+                _import_onnxruntime()
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+
+    try:
+        verify_export(model, path, backend, quantize)
+    except RuntimeError:
+        path.unlink(missing_ok=True)
+        raise
+
+    if activate:
+        manifest = {"fingerprint": fingerprint, "backend": backend, "quantized": quantize, "path": path.name}
+        (path.parent / "active.json").write_text(json.dumps(manifest, indent=4))
+    return path
+
+def verify_export(model, path, backend, quantize=False):
+    """
+    Run the eager model and the export on the same random sample and raise a RuntimeError
+    if their logits differ by more than EXPORT_TOLERANCE, or for int8 exports if their
+    argmax agrees on fewer than QUANTIZED_MIN_AGREEMENT of the pixels.
+    """
+    generator = torch.Generator().manual_seed(0)
+    sample = torch.randn((1, 3, EXPORT_INPUT_SIZE, EXPORT_INPUT_SIZE), generator=generator)
+    with torch.no_grad():
+        expected = model.eval()(pixel_values=sample).logits.float()
+        actual = ExportedModel(path, backend)(pixel_values=sample).logits.float()
+
+    if actual.shape != expected.shape:
+        raise RuntimeError(f"The {backend} export returns logits of shape {tuple(actual.shape)}, expected {tuple(expected.shape)}.")
+    difference = (actual - expected).abs().max().item()
+    agreement = (actual.argmax(dim=1) == expected.argmax(dim=1)).float().mean().item()
+    if (agreement < QUANTIZED_MIN_AGREEMENT) if quantize else (difference > EXPORT_TOLERANCE):
+        raise RuntimeError(
+            f"The {backend} export does not match the eager model (max difference {difference:.3g}, "
+            f"argmax agreement {agreement:.1%}); it was not activated."
+        )
+    return difference, agreement
+
+def find_exported_model(fingerprint, directory=None):
+    "Return the (path, backend, quantized) of the active export for this model fingerprint, or None."
+    manifest_path = Path(directory or export_directory()) / "active.json"
+    try:
+        manifest = json.loads(manifest_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    path = manifest_path.parent / manifest.get("path", "")
+    if manifest.get("fingerprint") != fingerprint or not path.is_file():
+        return None
+    return path, manifest["backend"], manifest.get("quantized", False)
+
+def disable_exported_model(directory=None):
+    "Stop using the active export; the eager model is loaded on the next start."
+    (Path(directory or export_directory()) / "active.json").unlink(missing_ok=True)
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise RuntimeError("The ONNX backend requires the 'onnx' and 'onnxruntime' packages.") from e
+    return onnxruntime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx")
+    parser.add_argument("--quantize", action="store_true", help="Apply dynamic int8 quantization.")
+    parser.add_argument("--disable", action="store_true", help="Go back to the eager PyTorch model.")
+    args = parser.parse_args()
+
+    if args.disable:
+        disable_exported_model()
+        print("Exported model disabled; the eager model will be used.")
+        return
+
+    from app.model import ModelManager
+    manager = ModelManager(use_exported=False)
+    model, _ = manager.wait_until_ready()
+    path = export_model(model, manager.fingerprint(), backend=args.backend, quantize=args.quantize)
+    print(f"Exported model to {path}")
+
+
+if __name__ == "__main__":
+    main()
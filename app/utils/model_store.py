@@ -0,0 +1,136 @@
+"""
+Utility for keeping a local copy of the segmentation model so it can start without network access.
+
+Import the model once with:
+    python -m app.utils.model_store
+
+The weights are stored as safetensors in the app data directory and memory-mapped on load,
+so they are not copied into process memory and can be shared by several processes.
+"""
+
+import argparse
+import json
+import mmap
+import shutil
+import struct
+from pathlib import Path
+import torch
+from safetensors.torch import save_file
+from transformers import SegformerConfig, SegformerForSemanticSegmentation, SegformerImageProcessor
+from app.utils.app_data import get_app_data_dir
+
+STORE_MANIFEST = "store.json"
+WEIGHTS_FILE = "model.safetensors"
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def store_directory():
+    return get_app_data_dir("models", "store")
+
+def import_model(model, feature_extractor, model_id, processor_id, commit_hash, directory=None):
+    """
+    Write the model config, its weights as safetensors and the image processor to the store.
+    The weights are saved under the loaded module's own parameter names so they can be
+    assigned back without any conversion.
+    """
+    directory = Path(directory or store_directory())
+    temp_directory = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    temp_directory.mkdir(parents=True)
+
+    model.config.save_pretrained(temp_directory / "model")
+    state_dict = {name: tensor.detach().contiguous() for name, tensor in model.state_dict().items()}
+    save_file(state_dict, str(temp_directory / "model" / WEIGHTS_FILE))
+    feature_extractor.save_pretrained(temp_directory / "processor")
+
+    manifest = {"model_id": model_id, "processor_id": processor_id, "commit_hash": commit_hash}
+    (temp_directory / STORE_MANIFEST).write_text(json.dumps(manifest, indent=4))
+
+    shutil.rmtree(directory, ignore_errors=True)
+    temp_directory.replace(directory)
+    return directory
+
+def find_local_model(model_id, processor_id, directory=None):
+    "Return the store manifest if the store holds the given model and processor, else None."
+    directory = Path(directory or store_directory())
+    try:
+        manifest = json.loads((directory / STORE_MANIFEST).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if manifest.get("model_id") != model_id or manifest.get("processor_id") != processor_id:
+        return None
+    if not (directory / "model" / WEIGHTS_FILE).is_file():
+        return None
+    return manifest
+
+def load_local_model(directory=None):
+    """
+    Build the model from the stored config without initialising weights and assign the
+    memory-mapped safetensors weights to it.
+    """
+    directory = Path(directory or store_directory())
+    config = SegformerConfig.from_pretrained(directory / "model", local_files_only=True)
+    with torch.device("meta"):
+        model = SegformerForSemanticSegmentation(config)
+
+    model.load_state_dict(load_safetensors_mmap(directory / "model" / WEIGHTS_FILE), assign=True)
+    return model.eval()
+
+def load_local_processor(directory=None):
+    directory = Path(directory or store_directory())
+    return SegformerImageProcessor.from_pretrained(directory / "processor", local_files_only=True)
+
+def load_safetensors_mmap(path):
+    """
+    Return the tensors of a safetensors file as views into a private memory map of it.
+    Pages are read lazily and shared with other processes mapping the same file until written.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // dtype.itemsize
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=8 + header_size + start).reshape(info["shape"])
+    return tensors
+
+def remove_local_model(directory=None):
+    "Delete the store; the model is downloaded from the Hugging Face hub on the next start."
+    shutil.rmtree(Path(directory or store_directory()), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--remove", action="store_true", help="Delete the local copy of the model.")
+    args = parser.parse_args()
+
+    if args.remove:
+        remove_local_model()
+        print("Local model store removed.")
+        return
+
+    from app.model import MODEL_ID, PROCESSOR_ID, ModelManager
+    manager = ModelManager(use_exported=False, use_store=False)
+    model, feature_extractor = manager.wait_until_ready()
+    commit_hash = manager.fingerprint().rpartition("@")[2]
+    path = import_model(model, feature_extractor.processor, MODEL_ID, PROCESSOR_ID, commit_hash)
+    print(f"Imported {MODEL_ID} into {path}")
+
+
+if __name__ == "__main__":
+    main()
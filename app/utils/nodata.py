@@ -0,0 +1,57 @@
+"""
+Utility for finding no-data regions (transparent or nodata-coloured pixels) in images.
+"""
+
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+
+# mask: (H, W) boolean no-data mask of the full image
+# bounds: (top, bottom, left, right) box enclosing every valid pixel, or None if there are none
+# shape: (H, W) of the full image
+NoDataRegion = namedtuple("NoDataRegion", ["mask", "bounds", "shape"])
+
+
+def read_image(path, nodata_color=None):
+    """
+    Read an image as an (H, W, 3) RGB array together with its NoDataRegion.
+    Pixels are no-data when fully transparent or, with nodata_color, exactly that RGB colour.
+    The region is None when the image has no no-data pixels.
+    """
+    image = Image.open(path)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+    if has_alpha:
+        rgba = np.array(image.convert("RGBA"))
+        rgb = np.ascontiguousarray(rgba[..., :3])
+        mask = rgba[..., 3] == 0
+    else:
+        rgb = np.array(image.convert("RGB"))
+        mask = np.zeros(rgb.shape[:2], dtype=bool)
+
+    if nodata_color is not None:
+        mask |= (rgb == np.asarray(nodata_color, dtype=np.uint8)).all(axis=2)
+
+    if not mask.any():
+        return rgb, None
+    return rgb, NoDataRegion(mask, valid_bounds(mask), mask.shape)
+
+def valid_bounds(mask):
+    "Return the (top, bottom, left, right) box enclosing all valid pixels of a no-data mask, or None."
+    valid_rows = np.flatnonzero(~mask.all(axis=1))
+    if valid_rows.size == 0:
+        return None
+    valid_columns = np.flatnonzero(~mask.all(axis=0))
+    return valid_rows[0], valid_rows[-1] + 1, valid_columns[0], valid_columns[-1] + 1
+
+def crop(array, bounds):
+    top, bottom, left, right = bounds
+    return array[top:bottom, left:right]
+
+def paste_labels(labels, region):
+    "Place labels segmented on the cropped valid area into a full-size map with no-data set to 0."
+    full = np.zeros(region.shape, dtype=np.uint8)
+    if region.bounds is not None:
+        crop(full, region.bounds)[...] = labels
+    full[region.mask] = 0
+    return full
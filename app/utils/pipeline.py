@@ -0,0 +1,170 @@
+"""
+Utility for running work in overlapping stages connected by bounded queues.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+_DONE = object()
+
+
+class QueueDepth:
+    "Records how many items were waiting each time one was added to a queue."
+
+    def __init__(self, name):
+        self.name = name
+        self.max_depth = 0
+        self._total = 0
+        self._samples = 0
+
+    def record(self, depth):
+        self.max_depth = max(self.max_depth, depth)
+        self._total += depth
+        self._samples += 1
+
+    @property
+    def mean_depth(self):
+        return self._total / self._samples if self._samples else 0.0
+
+
+class StageQueue(queue.Queue):
+    """
+    Bounded queue between two pipeline stages.
+
+    Args:
+        depth (QueueDepth): Depth statistics updated on every put.
+        maxsize (int): Maximum number of queued items.
+        abort (threading.Event): Event that unblocks producers and consumers when the pipeline fails.
+    """
+
+    def __init__(self, depth, maxsize, abort):
+        super().__init__(maxsize)
+        self.depth = depth
+        self.abort = abort
+
+    def put(self, item, block=True, timeout=None):
+        while not self.abort.is_set():
+            try:
+                super().put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            if item is not _DONE:
+                self.depth.record(self.qsize())
+            return
+
+    def close(self):
+        "Signal consumers that no more items will follow."
+        self.put(_DONE)
+
+    def __iter__(self):
+        while not self.abort.is_set():
+            try:
+                item = self.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+
+class StageTimer:
+    "Accumulates the number of items a stage handled and the time it spent on them."
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    @contextmanager
+    def measure(self, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.items += items
+
+
+class Pipeline:
+    """
+    Owns the queues, timers and background threads of a staged run.
+
+    A failing stage sets the abort event so no other stage stays blocked on a queue,
+    and join() re-raises the first error.
+    """
+
+    def __init__(self):
+        self.abort = threading.Event()
+        self.queues = []
+        self.timers = []
+        self._threads = []
+        self._errors = []
+        self._start = time.perf_counter()
+
+    def queue(self, name, maxsize):
+        "Create a bounded queue that is included in the report."
+        return StageQueue(self.depth(name), maxsize, self.abort)
+
+    def depth(self, name):
+        "Create depth statistics that are included in the report."
+        depth = QueueDepth(name)
+        self.queues.append(depth)
+        return depth
+
+    def timer(self, name):
+        "Create a stage timer that is included in the report."
+        timer = StageTimer(name)
+        self.timers.append(timer)
+        return timer
+
+    def start_stage(self, name, func, items, outbox=None):
+        """
+        Run func on every item in a background thread, putting results that are not None into outbox.
+        items can be a StageQueue or any iterable.
+        """
+        timer = self.timer(name)
+
+        def run():
+            try:
+                for item in items:
+                    if self.abort.is_set():
+                        break
+                    with timer.measure():
+                        result = func(item)
+                    if outbox is not None and result is not None:
+                        outbox.put(result)
+            except BaseException as e:
+                self.fail(e)
+            finally:
+                if outbox is not None:
+                    outbox.close()
+
+        thread = threading.Thread(target=run, name=f"{name}-stage", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def fail(self, error):
+        "Record an error and stop every stage."
+        self._errors.append(error)
+        self.abort.set()
+
+    def join(self):
+        "Wait for all stages to finish and re-raise the first error."
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def report(self, title="Pipeline"):
+        "Return a plain text summary of stage timings and queue depths."
+        elapsed = time.perf_counter() - self._start
+        lines = [f"{title} finished in {elapsed:.2f}s", f"{'stage':<10}{'items':>7}{'busy (s)':>11}{'per item (s)':>15}"]
+        for timer in self.timers:
+            per_item = timer.seconds / timer.items if timer.items else 0.0
+            lines.append(f"{timer.name:<10}{timer.items:>7}{timer.seconds:>11.2f}{per_item:>15.3f}")
+        lines.append(f"{'queue':<10}{'max depth':>11}{'mean depth':>12}")
+        for depth in self.queues:
+            lines.append(f"{depth.name:<10}{depth.max_depth:>11}{depth.mean_depth:>12.2f}")
+        return "\n".join(lines)
@@ -0,0 +1,100 @@
+"""
+Utility for turning images into model inputs with batched torch operations.
+"""
+
+from collections import defaultdict
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+PIL_BILINEAR = 2
+
+
+class ImagePreprocessor:
+    """
+    Vectorized equivalent of SegformerImageProcessor for inference.
+
+    Images are converted to RGB, resized with antialiased bilinear interpolation, rescaled
+    and ImageNet-normalized in one fused multiply-add, and returned channel-first. Images
+    of the same size are resized together in one call. It is called like the processor:
+    preprocessor(images=images, return_tensors="pt")["pixel_values"].
+
+    Args:
+        size (tuple): Output (height, width).
+        image_mean (tuple): Per-channel mean subtracted after rescaling.
+        image_std (tuple): Per-channel standard deviation divided by after rescaling.
+        rescale_factor (float): Factor applied to pixel values before normalizing.
+        processor (SegformerImageProcessor): The processor the settings were read from, if any.
+    """
+
+    def __init__(self, size=(512, 512), image_mean=IMAGENET_MEAN, image_std=IMAGENET_STD,
+                 rescale_factor=1 / 255, processor=None):
+        self.size = tuple(size)
+        self.processor = processor
+
+        mean = torch.tensor(image_mean, dtype=torch.float32).view(1, 3, 1, 1)
+        std = torch.tensor(image_std, dtype=torch.float32).view(1, 3, 1, 1)
+        self._scale = rescale_factor / std
+        self._shift = -mean / std
+
+    @classmethod
+    def from_processor(cls, processor, size=None):
+        """
+        Read the resize and normalization settings of a Hugging Face image processor.
+        An int size replaces the processor's output size with a square one.
+        """
+        if int(getattr(processor, "resample", PIL_BILINEAR)) != PIL_BILINEAR:
+            raise ValueError("ImagePreprocessor only supports bilinear resizing.")
+
+        size = (size, size) if size else (processor.size["height"], processor.size["width"])
+        mean = processor.image_mean if processor.do_normalize else (0.0, 0.0, 0.0)
+        std = processor.image_std if processor.do_normalize else (1.0, 1.0, 1.0)
+        return cls(
+            size=size if processor.do_resize else None,
+            image_mean=mean,
+            image_std=std,
+            rescale_factor=processor.rescale_factor if processor.do_rescale else 1.0,
+            processor=processor,
+        )
+
+    def __call__(self, images, return_tensors="pt", **kwargs):
+        if return_tensors != "pt":
+            raise ValueError("ImagePreprocessor only returns PyTorch tensors.")
+        return {"pixel_values": self.preprocess(images)}
+
+    def preprocess(self, images):
+        "Return the (N, 3, height, width) float32 input tensor for a list of images."
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        arrays = [to_rgb_array(image) for image in images]
+
+        groups = defaultdict(list)
+        for index, array in enumerate(arrays):
+            groups[array.shape].append(index)
+
+        output = None
+        for indices in groups.values():
+            batch = torch.from_numpy(np.stack([arrays[index] for index in indices])).permute(0, 3, 1, 2)
+            if batch.dtype != torch.uint8:
+                batch = batch.float()
+            if self.size is not None and tuple(batch.shape[2:]) != self.size:
+                batch = F.interpolate(batch, size=self.size, mode="bilinear", antialias=True, align_corners=False)
+            batch = torch.addcmul(self._shift, batch.float(), self._scale)
+
+            if output is None:
+                output = batch.new_empty((len(arrays), *batch.shape[1:]))
+            output[indices] = batch
+        return output
+
+
+def to_rgb_array(image):
+    "Return an (H, W, 3) array from a PIL image, array or tensor, dropping alpha like PIL's RGB conversion."
+    if hasattr(image, "convert"):
+        return np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return np.repeat(array[..., None], 3, axis=2)
+    return np.ascontiguousarray(array[..., :3])
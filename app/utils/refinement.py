@@ -0,0 +1,208 @@
+"""
+Utility for refining segmentation probabilities with an edge-aware refinement engine.
+"""
+
+import numpy as np
+from PIL import Image
+
+try:
+    import pydensecrf.densecrf as dcrf
+    from pydensecrf.utils import unary_from_softmax
+except ImportError:
+    dcrf = None
+
+CRF_PARAMS = {
+    "gaussian_sxy": 3,
+    "gaussian_compat": 4,
+    "bilateral_sxy": 3,
+    "bilateral_srgb": 20,
+    "bilateral_compat": 5,
+    "iterations": 5,
+}
+
+GUIDED_PARAMS = {
+    "radius": 8,
+    "eps": 1e-3,
+    "subsample": 4,
+}
+
+UPSAMPLE_MODES = ("probabilities", "labels")
+
+
+class RefinementEngine:
+    """
+    Base class for engines that sharpen (C, H, W) class probabilities along image edges.
+
+    Attributes:
+        name (str): Name used to select the engine.
+        params (dict): Settings that affect the output, used in cache keys.
+    """
+    name = None
+    params = {}
+
+    def is_available(self):
+        return True
+
+    def refine(self, image, probabilities, scale=1.0):
+        "Return refined (C, H, W) float32 probabilities for the (H, W, 3) uint8 image."
+        raise NotImplementedError
+
+
+class DenseCRFEngine(RefinementEngine):
+    "Fully connected CRF with Gaussian and bilateral pairwise terms (requires pydensecrf)."
+    name = "densecrf"
+    params = CRF_PARAMS
+
+    def is_available(self):
+        return dcrf is not None
+
+    def refine(self, image, probabilities, scale=1.0):
+        num_classes, height, width = probabilities.shape
+
+        d = dcrf.DenseCRF2D(width, height, num_classes)
+        unary = unary_from_softmax(probabilities)
+        d.setUnaryEnergy(np.ascontiguousarray(unary))
+
+        params = self.params
+        d.addPairwiseGaussian(sxy=max(1.0, params["gaussian_sxy"] * scale), compat=params["gaussian_compat"])
+        d.addPairwiseBilateral(
+            sxy=max(1.0, params["bilateral_sxy"] * scale), srgb=params["bilateral_srgb"],
+            rgbim=np.ascontiguousarray(image), compat=params["bilateral_compat"]
+        )
+
+        refined = d.inference(params["iterations"])
+        return np.array(refined, dtype=np.float32).reshape((num_classes, height, width))
+
+
+class GuidedFilterEngine(RefinementEngine):
+    """
+    Fast guided filter (He and Sun, 2015) applied to every probability map with the image
+    luminance as guide. The linear coefficients are fitted at 1/subsample resolution, which
+    matches the coarse model output, and upsampled before being applied to the full-resolution
+    guide. Box filters use integral images, so the cost does not depend on the radius.
+    """
+    name = "guided"
+    params = GUIDED_PARAMS
+
+    def refine(self, image, probabilities, scale=1.0):
+        radius = max(1, self.params["radius"] * scale)
+        subsample = max(1, min(self.params["subsample"], int(radius)))
+        eps = self.params["eps"]
+
+        guide = (image.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)) / 255.0
+        size = guide.shape
+        low_size = (max(1, round(size[0] / subsample)), max(1, round(size[1] / subsample)))
+        low_radius = max(1, round(radius / subsample))
+
+        low_guide = _resize_plane(guide, low_size)
+        count = _box_sum(np.ones(low_size, dtype=np.float32), low_radius)
+        mean_guide = _box_sum(low_guide, low_radius) / count
+        var_guide = _box_sum(low_guide * low_guide, low_radius) / count - mean_guide ** 2
+
+        refined = np.empty(probabilities.shape, dtype=np.float32)
+        for class_id, plane in enumerate(probabilities):
+            low_plane = _resize_plane(plane, low_size)
+            mean_plane = _box_sum(low_plane, low_radius) / count
+            cov = _box_sum(low_guide * low_plane, low_radius) / count - mean_guide * mean_plane
+            a = cov / (var_guide + eps)
+            b = mean_plane - a * mean_guide
+
+            mean_a = _box_sum(a, low_radius) / count
+            mean_b = _box_sum(b, low_radius) / count
+            refined[class_id] = _resize_plane(mean_a, size) * guide + _resize_plane(mean_b, size)
+
+        np.clip(refined, 0.0, None, out=refined)
+        return refined
+
+
+def _resize_plane(plane, size):
+    "Bilinearly resize a 2-D float32 array to (height, width)."
+    if plane.shape == tuple(size):
+        return plane
+    height, width = size
+    return np.asarray(Image.fromarray(plane).resize((width, height), Image.BILINEAR))
+
+def _box_sum(x, radius):
+    "Sum x over a (2r+1)^2 window around every pixel, clipped at the borders."
+    height, width = x.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(x, axis=0, dtype=np.float64), axis=1, out=integral[1:, 1:])
+
+    top = np.clip(np.arange(height) - radius, 0, height)[:, None]
+    bottom = np.clip(np.arange(height) + radius + 1, 0, height)[:, None]
+    left = np.clip(np.arange(width) - radius, 0, width)[None, :]
+    right = np.clip(np.arange(width) + radius + 1, 0, width)[None, :]
+
+    total = integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left]
+    return total.astype(np.float32)
+
+
+ENGINES = {engine.name: engine for engine in (DenseCRFEngine(), GuidedFilterEngine())}
+DEFAULT_ENGINE = "densecrf" if ENGINES["densecrf"].is_available() else "guided"
+
+
+def get_engine(name=None):
+    "Return the refinement engine registered under name, or the default engine."
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown refinement engine '{name}'. Expected one of {sorted(ENGINES)}.")
+
+    engine = ENGINES[name]
+    if not engine.is_available():
+        raise RuntimeError(f"Refinement engine '{name}' is not available. Is pydensecrf installed?")
+    return engine
+
+def refine_probabilities(image, probabilities, scale=1.0, engine=None):
+    """
+    Refine (C, H, W) probabilities guided by the (H, W, 3) image with the selected engine.
+    scale is the image's size relative to full resolution; spatial kernel widths are
+    scaled with it so they cover the same ground area.
+    """
+    return get_engine(engine).refine(image, probabilities, scale=scale)
+
+def scaled_size(size, scale):
+    "Return the (height, width) of size scaled by scale, at least 1 pixel each."
+    height, width = size
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+def resize_image(image, size):
+    "Resize an (H, W, 3) uint8 image to (height, width)."
+    if image.shape[:2] == tuple(size):
+        return image
+    height, width = size
+    return np.asarray(Image.fromarray(image).resize((width, height), Image.BILINEAR))
+
+def refine_to_labels(image, probabilities, output_size=None, upsample="probabilities", engine=None):
+    """
+    Refine probabilities with the selected engine and return uint8 labels of output_size.
+
+    image and probabilities may be at a reduced working resolution. The result is brought to
+    output_size either by bilinearly upsampling the refined probabilities ("probabilities")
+    or by nearest-neighbour upsampling the labels ("labels", cheaper but blockier).
+    """
+    if upsample not in UPSAMPLE_MODES:
+        raise ValueError(f"Unknown upsample mode '{upsample}'. Expected one of {UPSAMPLE_MODES}.")
+
+    working_size = probabilities.shape[1:]
+    output_size = tuple(output_size or working_size)
+    scale = working_size[0] / output_size[0]
+    refined = refine_probabilities(image, probabilities, scale=scale, engine=engine)
+
+    if output_size == working_size:
+        return np.argmax(refined, axis=0).astype(np.uint8)
+
+    height, width = output_size
+    if upsample == "labels":
+        labels = Image.fromarray(np.argmax(refined, axis=0).astype(np.uint8))
+        return np.asarray(labels.resize((width, height), Image.NEAREST))
+
+    # Upsample one class at a time and keep a running argmax, so only two
+    # full-resolution float planes exist at once
+    labels = np.zeros(output_size, dtype=np.uint8)
+    best = np.full(output_size, -np.inf, dtype=np.float32)
+    for class_id, plane in enumerate(refined):
+        upsampled = np.asarray(Image.fromarray(plane).resize((width, height), Image.BILINEAR))
+        better = upsampled > best
+        labels[better] = class_id
+        best[better] = upsampled[better]
+    return labels
@@ -0,0 +1,140 @@
+"""
+Utility for sending HTTP requests within a rate limit, retrying throttled and failed requests.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+
+# The Open-Meteo archive allows 600 requests per minute for non-commercial use
+REQUESTS_PER_SECOND = 10.0
+BURST = 10
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (10, 120)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that lets up to capacity requests through at once and refills
+    at rate tokens per second. Each caller reserves a token and sleeps until it is available,
+    so waiting callers are spaced evenly.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (int): Maximum number of stored tokens, i.e. the burst size.
+        clock (callable): Monotonic time source.
+        sleep (callable): Function used to wait.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("The rate must be positive and the capacity at least 1.")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def acquire(self):
+        "Take one token, waiting until it is available. Returns the time waited."
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        "Hold back every caller for seconds, e.g. when the server asked to retry later."
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class RequestScheduler:
+    """
+    Sends GET requests through a session within a token bucket rate limit.
+
+    Connection errors, timeouts and responses with a status in retry_statuses are retried up
+    to max_retries times. The wait before a retry is the server's Retry-After when given, which
+    also pauses every other request, and otherwise exponential backoff with full jitter.
+
+    Args:
+        session (requests.Session): Session to send requests with.
+        rate (float): Requests allowed per second.
+        burst (int): Requests allowed at once after an idle period.
+        max_retries (int): Retries after the first attempt.
+        backoff_base (float): Upper bound in seconds of the first backoff, doubled on each retry.
+        backoff_max (float): Upper bound in seconds of any backoff or Retry-After wait.
+        timeout (float or tuple): Per-request timeout passed to requests.
+        sleep (callable): Function used to wait.
+    """
+
+    def __init__(self, session, rate=REQUESTS_PER_SECOND, burst=BURST, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, timeout=REQUEST_TIMEOUT,
+                 retry_statuses=RETRY_STATUSES, sleep=time.sleep):
+        self.session = session
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self._sleep = sleep
+
+    def get(self, url, params=None):
+        """
+        Return the response of a GET request. After the last retry the final response is
+        returned even if its status is an error, or the final exception is raised.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Request failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in self.retry_statuses or attempt == self.max_retries:
+                    return response
+                retry_after = self.retry_after(response)
+                delay = self.backoff(attempt) if retry_after is None else min(retry_after, self.backoff_max)
+                print(f"Request returned {response.status_code}, retrying in {delay:.1f}s")
+                if retry_after is not None:
+                    # Waited for in the next acquire, together with every other request
+                    self.bucket.pause(delay)
+                    continue
+            self._sleep(delay)
+
+    def backoff(self, attempt):
+        "Return a random wait between 0 and backoff_base * 2 ** attempt, capped at backoff_max."
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(response):
+        "Return the wait in seconds asked for by a Retry-After header, or None."
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,106 @@
+"""
+Utility for caching segmentation results by image content.
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+from app.utils.app_data import get_app_data_dir
+
+CACHE_MAX_BYTES = 1024 ** 3
+
+CachedSegmentation = namedtuple("CachedSegmentation", ["label_freq", "labels"])
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    "Return the SHA-256 hex digest of a file's contents."
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SegmentationCache:
+    """
+    Stores label maps and class frequencies keyed by image content and segmentation settings.
+
+    Entries are compressed .npz files. When the cache grows past max_bytes the least recently
+    used entries are removed. The whole cache is cleared when it is opened with a different
+    model fingerprint.
+
+    Args:
+        model_fingerprint (str): Identifies the model weights; a change invalidates every entry.
+        directory (str): Cache directory. Defaults to 'cache/segmentation' in the app data directory.
+        max_bytes (int): Size limit of the cache directory.
+    """
+
+    def __init__(self, model_fingerprint, directory=None, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory) if directory else get_app_data_dir("cache", "segmentation")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        fingerprint_path = self.directory / "model.txt"
+        if not fingerprint_path.exists() or fingerprint_path.read_text() != model_fingerprint:
+            self.clear()
+            fingerprint_path.write_text(model_fingerprint)
+
+        self._size = sum(path.stat().st_size for path in self._entries())
+
+    def key(self, image_hash, settings):
+        "Combine an image content hash with the settings that affect its segmentation."
+        encoded = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha256(f"{image_hash}|{encoded}".encode()).hexdigest()
+
+    def get(self, key, load_labels=True):
+        "Return the CachedSegmentation stored under key, or None."
+
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                label_freq = entry["label_freq"].tolist()
+                labels = entry["labels"] if load_labels else None
+            os.utime(path)
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        return CachedSegmentation(label_freq, labels)
+
+    def put(self, key, labels, label_freq):
+        "Store a label map and its class frequencies, evicting old entries if needed."
+
+        path = self._path(key)
+        temp_path = path.with_suffix(".tmp.npz")
+        np.savez_compressed(temp_path, labels=labels, label_freq=np.asarray(label_freq, dtype=np.float64))
+        os.replace(temp_path, path)
+
+        self._size += path.stat().st_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        "Remove least recently used entries until the cache fits in max_bytes."
+
+        entries = sorted(self._entries(), key=lambda path: path.stat().st_mtime)
+        self._size = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._size -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        "Remove every cached entry."
+
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+    def _path(self, key):
+        return self.directory / f"{key}.npz"
+
+    def _entries(self):
+        return [path for path in self.directory.glob("*.npz") if not path.name.endswith(".tmp.npz")]
@@ -0,0 +1,89 @@
+"""
+Utility for tracking which dataset images have already been segmented.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+
+
+def settings_digest(settings):
+    "Return a short digest of the settings that affect segmentation output."
+    encoded = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+class SegmentationManifest:
+    """
+    Records the size, modification time and content hash of every segmented image,
+    together with a digest of the settings it was segmented with.
+
+    An image is up to date when its size and mtime are unchanged, or when they changed but
+    its content hash did not (e.g. the file was copied or touched). The manifest is stored
+    as 'manifest.json' in the dataset's segmentations directory.
+
+    Args:
+        segmentations_path (str): Directory holding the segmentation outputs and the manifest.
+    """
+
+    def __init__(self, segmentations_path):
+        self.path = Path(segmentations_path) / MANIFEST_NAME
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        self._changed = False
+
+    def is_current(self, image_path, digest, hash_file):
+        """
+        Return True if the image was segmented with the given settings digest and has not changed since.
+        hash_file is only called when the size or mtime differ from the recorded ones.
+        """
+        entry = self.entries.get(Path(image_path).name)
+        if entry is None or entry.get("settings") != digest:
+            return False
+
+        stat = os.stat(image_path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if entry["size"] != stat.st_size or hash_file(image_path) != entry["hash"]:
+            return False
+
+        entry["mtime_ns"] = stat.st_mtime_ns
+        self._changed = True
+        return True
+
+    def written_for(self, image_path, image_hash, digest):
+        "Return True if the outputs recorded for the image were written from this content and settings digest."
+        entry = self.entries.get(Path(image_path).name)
+        return entry is not None and entry.get("hash") == image_hash and entry.get("settings") == digest
+
+    def record(self, image_path, image_hash, digest):
+        "Mark the image as segmented with the given settings digest."
+        stat = os.stat(image_path)
+        self.entries[Path(image_path).name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": image_hash,
+            "settings": digest,
+        }
+        self._changed = True
+
+    def prune(self, image_paths):
+        "Drop entries of images that are no longer in the dataset."
+        names = {Path(path).name for path in image_paths}
+        for name in set(self.entries) - names:
+            del self.entries[name]
+            self._changed = True
+
+    def save(self):
+        "Write the manifest if any entry changed."
+        if not self._changed:
+            return
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_text(json.dumps(self.entries, indent=4))
+        temp_path.replace(self.path)
+        self._changed = False
@@ -0,0 +1,52 @@
+"""
+Compare model throughput of the per-image loop against batched inference.
+
+Usage:
+    python -m benchmarks.batch_inference --batch-sizes 1 2 4 8 --repeat 4
+"""
+
+import argparse
+import torch
+from PIL import Image
+from app.model import batched, model_manager, predict_logits
+from benchmarks.common import SAMPLE_DATASET_DIR, Timer, find_sample_images, print_table
+
+
+def run_batches(images, batch_size, model, feature_extractor):
+    "Run every image through the model in batches of batch_size."
+
+    with torch.no_grad():
+        for batch_images in batched(images, batch_size):
+            predict_logits(batch_images, model, feature_extractor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default=SAMPLE_DATASET_DIR)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=4, help="Repeat the image list to simulate larger datasets.")
+    args = parser.parse_args()
+
+    image_paths = find_sample_images(args.dataset_dir) * args.repeat
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    model, feature_extractor = model_manager.wait_until_ready()
+
+    # Warm up so the first measured run doesn't pay for lazy initialisation
+    run_batches(images[:1], 1, model, feature_extractor)
+
+    # Batch size 1 is the per-image loop every other size is compared against
+    rows = []
+    baseline = None
+    for batch_size in sorted({1, *args.batch_sizes}):
+        with Timer() as timer:
+            run_batches(images, batch_size, model, feature_extractor)
+        throughput = len(images) / timer.elapsed
+        baseline = baseline or throughput
+        rows.append([batch_size, f"{timer.elapsed:.2f}", f"{throughput:.2f}", f"{throughput / baseline:.2f}x"])
+
+    print(f"{len(images)} images")
+    print_table(["batch", "seconds", "images/s", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
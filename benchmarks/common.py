@@ -0,0 +1,66 @@
+"""
+Shared helpers for the segmentation benchmark scripts.
+"""
+
+import glob
+import os
+import time
+import numpy as np
+
+SAMPLE_DATASET_DIR = "Microclimate Analysis Sample Dataset"
+
+
+def find_sample_images(dataset_dir=SAMPLE_DATASET_DIR):
+    "Return the image paths of every dataset inside dataset_dir."
+
+    patterns = ("*.png", "*.jpg")
+    return sorted(
+        path
+        for pattern in patterns
+        for path in glob.glob(os.path.join(dataset_dir, "*", "images", pattern))
+    )
+
+
+class Timer:
+    "Context manager measuring wall-clock time in seconds."
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def print_table(headers, rows):
+    "Print rows as a plain aligned text table."
+
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def confusion_matrix(reference, labels, num_classes):
+    "Return the (num_classes, num_classes) pixel count matrix of reference vs labels."
+
+    pairs = reference.astype(np.int64).ravel() * num_classes + labels.ravel()
+    return np.bincount(pairs, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+
+def agreement_summary(confusion):
+    """
+    Return (pixel agreement, per-class IoU) for a confusion matrix against a reference.
+    Classes absent from both label maps get an IoU of NaN.
+    """
+    intersection = np.diag(confusion).astype(np.float64)
+    union = confusion.sum(axis=0) + confusion.sum(axis=1) - intersection
+    with np.errstate(invalid="ignore", divide="ignore"):
+        iou = intersection / union
+    return intersection.sum() / max(1, confusion.sum()), iou
+
+
+def format_agreement(confusion):
+    "Format pixel agreement and per-class IoU as table cells."
+
+    agreement, iou = agreement_summary(confusion)
+    return [f"{agreement * 100:.2f}%"] + ["-" if np.isnan(value) else f"{value:.3f}" for value in iou]
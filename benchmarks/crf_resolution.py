@@ -0,0 +1,69 @@
+"""
+Measure the speedup of reduced-resolution and alternative refinement engines, and their
+agreement with full-resolution output of the default engine (DenseCRF when installed).
+
+For every sample image the model runs once; refinement then runs at full resolution with the
+default engine and with every requested engine/scale/upsample combination, and the labels are
+compared with the full-resolution reference.
+
+Usage:
+    python -m benchmarks.crf_resolution --scales 1.0 0.5 0.25 --engines densecrf guided
+"""
+
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from app.model import LandCoverClass, apply_crf, model_manager, predict_logits
+from app.utils.refinement import DEFAULT_ENGINE
+from benchmarks.common import SAMPLE_DATASET_DIR, Timer, confusion_matrix, find_sample_images, format_agreement, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default=SAMPLE_DATASET_DIR)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.75, 0.5, 0.25])
+    parser.add_argument("--upsample", nargs="+", default=["probabilities", "labels"])
+    parser.add_argument("--engines", nargs="+", default=[DEFAULT_ENGINE])
+    args = parser.parse_args()
+
+    num_classes = LandCoverClass.num_labels
+    model, feature_extractor = model_manager.wait_until_ready()
+    configs = [
+        (engine, scale, upsample)
+        for engine in args.engines for scale in args.scales for upsample in args.upsample
+        if not (engine == DEFAULT_ENGINE and scale == 1.0)
+    ]
+    seconds = {config: 0.0 for config in configs}
+    confusions = {config: np.zeros((num_classes, num_classes), dtype=np.int64) for config in configs}
+    full_seconds = 0.0
+
+    for path in find_sample_images(args.dataset_dir):
+        image = Image.open(path).convert("RGB")
+        image_np = np.array(image)
+        with torch.no_grad():
+            logits = predict_logits([image], model, feature_extractor)[0]
+
+        with Timer() as timer:
+            reference = apply_crf(image_np, logits, num_classes, engine=DEFAULT_ENGINE)
+        full_seconds += timer.elapsed
+
+        for engine, scale, upsample in configs:
+            with Timer() as timer:
+                labels = apply_crf(image_np, logits, num_classes, crf_scale=scale, upsample=upsample, engine=engine)
+            seconds[engine, scale, upsample] += timer.elapsed
+            confusions[engine, scale, upsample] += confusion_matrix(reference, labels, num_classes)
+
+    class_names = [lc.name for lc in LandCoverClass.lc_classes]
+    headers = ["engine", "scale", "upsample", "seconds", "speedup", "agreement"] + [f"IoU {name}" for name in class_names]
+    rows = [[DEFAULT_ENGINE, "1.0", "-", f"{full_seconds:.2f}", "1.00x", "100.00%"] + ["1.000"] * num_classes]
+    for config in configs:
+        rows.append([
+            *config, f"{seconds[config]:.2f}", f"{full_seconds / seconds[config]:.2f}x",
+            *format_agreement(confusions[config]),
+        ])
+    print_table(headers, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare latency and label agreement of exported TorchScript/ONNX models against the eager model.
+
+Usage:
+    python -m benchmarks.export_inference --variants torchscript torchscript-int8 onnx onnx-int8
+"""
+
+import argparse
+import tempfile
+import torch
+from PIL import Image
+from app.model import LandCoverClass, ModelManager, predict_logits, upsample_probabilities
+from app.utils.model_export import ExportedModel, export_model
+from benchmarks.common import SAMPLE_DATASET_DIR, Timer, confusion_matrix, find_sample_images, format_agreement, print_table
+
+VARIANTS = ["torchscript", "torchscript-int8", "onnx", "onnx-int8"]
+
+
+def run_model(images, model, feature_extractor):
+    "Return the total inference time and the per-image label maps at image resolution."
+
+    seconds = 0.0
+    labels = []
+    with torch.no_grad():
+        for image in images:
+            with Timer() as timer:
+                logits = predict_logits([image], model, feature_extractor)[0]
+            seconds += timer.elapsed
+            labels.append(upsample_probabilities(logits, image.size[::-1]).argmax(axis=0))
+    return seconds, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default=SAMPLE_DATASET_DIR)
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=VARIANTS)
+    args = parser.parse_args()
+
+    images = [Image.open(path).convert("RGB") for path in find_sample_images(args.dataset_dir)]
+    manager = ModelManager(use_exported=False)
+    model, feature_extractor = manager.wait_until_ready()
+
+    # Warm up so the first measured run doesn't pay for lazy initialisation
+    run_model(images[:1], model, feature_extractor)
+    baseline_seconds, reference = run_model(images, model, feature_extractor)
+
+    num_classes = LandCoverClass.num_labels
+    baseline = sum(confusion_matrix(ref, ref, num_classes) for ref in reference)
+    rows = [["eager", f"{baseline_seconds / len(images) * 1000:.0f}", "1.00x", *format_agreement(baseline)]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for variant in args.variants:
+            backend, _, quantized = variant.partition("-")
+            try:
+                path = export_model(model, manager.fingerprint(), backend, quantize=bool(quantized),
+                                    directory=directory, activate=False)
+            except RuntimeError as e:
+                print(f"Skipping {variant}: {e}")
+                continue
+            exported = ExportedModel(path, backend)
+
+            run_model(images[:1], exported, feature_extractor)
+            seconds, labels = run_model(images, exported, feature_extractor)
+            confusion = sum(confusion_matrix(ref, lab, num_classes) for ref, lab in zip(reference, labels))
+            rows.append([variant, f"{seconds / len(images) * 1000:.0f}", f"{baseline_seconds / seconds:.2f}x",
+                         *format_agreement(confusion)])
+
+    print(f"{len(images)} images, agreement and IoU against the eager model")
+    print_table(["variant", "ms/image", "speedup", "agreement", *LandCoverClass.id2label.values()], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the speedup of bfloat16 autocast inference and how many pixels change label against float32.
+
+Labels are compared after refinement, so the numbers include any effect on the refinement engine.
+
+Usage:
+    python -m benchmarks.mixed_precision --batch-size 4 --engine guided
+"""
+
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from app.model import BATCH_SIZE, LandCoverClass, batched, model_manager, predict_logits, upsample_probabilities
+from app.utils.refinement import refine_to_labels
+from benchmarks.common import SAMPLE_DATASET_DIR, Timer, confusion_matrix, find_sample_images, format_agreement, print_table
+
+
+def segment(images, model, feature_extractor, batch_size, precision, engine):
+    "Return the time spent in the model and the refined label map of every image."
+
+    seconds = 0.0
+    labels = []
+    with torch.no_grad():
+        for batch_images in batched(images, batch_size):
+            with Timer() as timer:
+                batch_logits = predict_logits(batch_images, model, feature_extractor, precision)
+            seconds += timer.elapsed
+
+            for image, logits in zip(batch_images, batch_logits):
+                probabilities = upsample_probabilities(logits, image.shape[:2])
+                labels.append(refine_to_labels(image, probabilities, engine=engine))
+    return seconds, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default=SAMPLE_DATASET_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--engine", default=None, help="Refinement engine; defaults to the app default.")
+    args = parser.parse_args()
+
+    images = [np.array(Image.open(path).convert("RGB")) for path in find_sample_images(args.dataset_dir)]
+    model, feature_extractor = model_manager.wait_until_ready()
+    print(f"Native bf16 support: {torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()}")
+
+    results = {}
+    for precision in ("float32", "bfloat16"):
+        # Warm up so the first measured run doesn't pay for lazy initialisation
+        segment(images[:1], model, feature_extractor, 1, precision, args.engine)
+        results[precision] = segment(images, model, feature_extractor, args.batch_size, precision, args.engine)
+
+    num_classes = LandCoverClass.num_labels
+    baseline_seconds, reference = results["float32"]
+    rows = []
+    for precision, (seconds, labels) in results.items():
+        confusion = sum(confusion_matrix(ref, lab, num_classes) for ref, lab in zip(reference, labels))
+        changed = confusion.sum() - np.trace(confusion)
+        rows.append([precision, f"{seconds / len(images) * 1000:.0f}", f"{baseline_seconds / seconds:.2f}x",
+                     f"{changed}", *format_agreement(confusion)])
+
+    print(f"{len(images)} images, labels compared with float32")
+    print_table(["precision", "ms/image", "speedup", "changed px", "agreement", *LandCoverClass.id2label.values()], rows)
+
+
+if __name__ == "__main__":
+    main()
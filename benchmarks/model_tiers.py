@@ -0,0 +1,81 @@
+"""
+Evaluate every registered model tier on the sample datasets.
+
+Each tier runs in its own process, so peak RSS covers loading and running that tier alone.
+Reports images/second, peak RSS and per-class agreement with the accurate tier.
+
+Usage:
+    python -m benchmarks.model_tiers --tiers accurate fast
+"""
+
+import argparse
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+from app.model import BATCH_SIZE, LandCoverClass, MODEL_TIERS, batched, get_model_manager, predict_logits, upsample_probabilities
+from benchmarks.common import SAMPLE_DATASET_DIR, Timer, confusion_matrix, find_sample_images, format_agreement, print_table
+
+REFERENCE_TIER = "accurate"
+
+
+def peak_rss_bytes():
+    "Return the peak resident set size of this process, or None where it cannot be read."
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def evaluate_tier(tier, image_paths, batch_size):
+    "Segment the images with one tier and return (seconds, peak RSS, label maps)."
+
+    images = [np.array(Image.open(path).convert("RGB")) for path in image_paths]
+    model, feature_extractor = get_model_manager(tier).wait_until_ready()
+
+    labels = []
+    with torch.no_grad():
+        # Warm up so the measured run doesn't pay for lazy initialisation
+        predict_logits(images[:1], model, feature_extractor)
+
+        with Timer() as timer:
+            for batch_images in batched(images, batch_size):
+                for image, logits in zip(batch_images, predict_logits(batch_images, model, feature_extractor)):
+                    labels.append(upsample_probabilities(logits, image.shape[:2]).argmax(axis=0).astype(np.uint8))
+    return timer.elapsed, peak_rss_bytes(), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default=SAMPLE_DATASET_DIR)
+    parser.add_argument("--tiers", nargs="+", choices=sorted(MODEL_TIERS), default=list(MODEL_TIERS))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    image_paths = find_sample_images(args.dataset_dir)
+    tiers = [REFERENCE_TIER] + [tier for tier in args.tiers if tier != REFERENCE_TIER]
+
+    results = {}
+    for tier in tiers:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[tier] = executor.submit(evaluate_tier, tier, image_paths, args.batch_size).result()
+
+    num_classes = LandCoverClass.num_labels
+    reference = results[REFERENCE_TIER][2]
+    rows = []
+    for tier, (seconds, peak_rss, labels) in results.items():
+        confusion = sum(confusion_matrix(ref, lab, num_classes) for ref, lab in zip(reference, labels))
+        rss = "n/a" if peak_rss is None else f"{peak_rss / 1024 ** 2:.0f}"
+        rows.append([tier, MODEL_TIERS[tier].input_size, f"{len(labels) / seconds:.2f}", rss, *format_agreement(confusion)])
+
+    print(f"{len(image_paths)} images, agreement and IoU against the {REFERENCE_TIER} tier")
+    print_table(["tier", "input", "images/s", "peak RSS (MB)", "agreement", *LandCoverClass.id2label.values()], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,17 @@ Main application file for initializing and running the GUI application.
 import sys
 import os
 import json
+import multiprocessing
 from PyQt5.QtWidgets import QApplication, QMainWindow
 from PyQt5.uic import loadUi
 from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import QTimer
 
 from app.controllers.sidebar_controller import SidebarController
 from app.controllers.create_data_controller import CreateDataController
 from app.controllers.segment_data_controller import SegmentDataController
 from app.controllers.analysis_controller import AnalysisPageController
+from app.model import model_manager
 
 class MainApp(QMainWindow):
     """
@@ -65,7 +68,13 @@ class MainApp(QMainWindow):
             print(f"Error loading styles: {e}")
 
 if __name__ == "__main__":
+    # Required for the CRF worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
     window = MainApp()
     window.showMaximized()
+
+    # Load the segmentation model once the window is up
+    QTimer.singleShot(0, model_manager.start_loading)
     sys.exit(app.exec_())
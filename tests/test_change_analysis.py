@@ -0,0 +1,77 @@
+import json
+import numpy as np
+import pandas as pd
+from PIL import Image
+from app.controllers.analysis_controller import AnalysisPageController
+from app.model import LandCoverClass, label_map_path, save_label_map
+from app.utils.change_analysis import transition_matrix, write_change_analysis
+
+
+def test_transition_matrix_matches_pixel_pairs():
+    "Test that the blockwise counts equal a direct count of the label pairs."
+
+    rng = np.random.default_rng(0)
+    labels_from = rng.integers(0, 9, (37, 23), dtype=np.uint8)
+    labels_to = rng.integers(0, 9, (37, 23), dtype=np.uint8)
+    change_raster = np.empty_like(labels_from)
+
+    counts = transition_matrix(labels_from, labels_to, 9, block_rows=5, change_raster=change_raster)
+
+    expected = np.zeros((9, 9), dtype=np.int64)
+    np.add.at(expected, (labels_from, labels_to), 1)
+    np.testing.assert_array_equal(counts, expected)
+    np.testing.assert_array_equal(change_raster, labels_from * 9 + labels_to)
+
+
+def test_transition_matrix_resamples_different_shapes():
+    "Test that the later map is resampled to the shape of the earlier one."
+
+    labels_from = np.zeros((4, 4), dtype=np.uint8)
+    labels_to = np.kron(np.array([[1, 2], [3, 4]], dtype=np.uint8), np.ones((3, 3), dtype=np.uint8))
+
+    counts = transition_matrix(labels_from, labels_to, 9, block_rows=3)
+    assert counts.sum() == 16
+    assert list(counts[0, 1:5]) == [4, 4, 4, 4]
+
+
+def test_write_change_analysis_outputs(tmp_path):
+    "Test that a transition table, change raster and preview are written for consecutive years."
+
+    segmentations = tmp_path / "segmentations"
+    segmentations.mkdir()
+    maps = {2010: np.full((6, 6), 5, np.uint8), 2015: np.full((6, 6), 5, np.uint8), 2020: np.full((6, 6), 8, np.uint8)}
+    maps[2015][:2] = 3
+    images = {}
+    for year, labels in maps.items():
+        seg_path = segmentations / f"scene_{year}_seg.png"
+        Image.fromarray(LandCoverClass.palette[labels]).save(seg_path)
+        save_label_map(labels, label_map_path(seg_path))
+        images[f"scene_{year}.png"] = {"year": year}
+    (tmp_path / "metadata.json").write_text(json.dumps({"images": images}))
+
+    tables = write_change_analysis(tmp_path, block_rows=4)
+
+    assert [path.name for path in tables] == ["transitions_2010_2015.csv", "transitions_2015_2020.csv"]
+    table = pd.read_csv(tables[0], index_col=0)
+    assert table.loc["Tree", "Tree"] == 24
+    assert table.loc["Tree", "Developed Space"] == 12
+    assert table.values.sum() == 36
+
+    change_raster = np.load(tmp_path / "analysis" / "change_2015_2020.npy")
+    assert (change_raster[2:] == 5 * 9 + 8).all()
+    preview = np.array(Image.open(tmp_path / "analysis" / "change_2010_2015.png"))
+    assert (preview[:2] == 3).all() and (preview[2:] == 9).all()
+
+
+def test_change_analysis_is_best_effort(tmp_path):
+    "Test that missing segmentations skip the change analysis and failures are returned, not raised."
+
+    images = {"scene_2000.png": {"year": 2000}, "scene_2010.png": {"year": 2010}}
+    (tmp_path / "metadata.json").write_text(json.dumps({"images": images}))
+    assert AnalysisPageController.generate_change_analysis(None, tmp_path) is None
+    assert not (tmp_path / "analysis").exists()
+
+    (tmp_path / "segmentations").mkdir()
+    for year in (2000, 2010):
+        (tmp_path / "segmentations" / f"scene_{year}_seg.png").write_bytes(b"not a png")
+    assert AnalysisPageController.generate_change_analysis(None, tmp_path)
@@ -0,0 +1,43 @@
+from app.utils.climate_cache import ClimateCache
+
+
+def test_key_rounds_coordinates_and_sorts_params():
+    "Test that nearby coordinates and reordered parameters share a cache entry."
+
+    key, _ = ClimateCache.key(40.0012, -74.0049, "2000-01-01", "2001-12-31", "daily", ["b", "a"])
+    same_key, _ = ClimateCache.key(39.9981, -74.0, "2000-01-01", "2001-12-31", "daily", ["a", "b"])
+    other_key, _ = ClimateCache.key(40.0, -74.0, "2000-01-01", "2002-12-31", "daily", ["a", "b"])
+
+    assert key == same_key
+    assert key != other_key
+
+
+def test_put_and_get_round_trip(tmp_path):
+    "Test that stored arrays are returned unchanged and persist across instances."
+
+    data = {"time": ["2000-01-01", "2000-01-02"], "temperature_2m_max": [1.5, None]}
+    cache = ClimateCache(tmp_path)
+    key, request = cache.key(40.0, -74.0, "2000-01-01", "2000-12-31", "daily", ["temperature_2m_max"])
+    cache.put(key, request, data)
+    cache.close()
+
+    assert ClimateCache(tmp_path).get(key) == data
+    assert ClimateCache(tmp_path).get("missing") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    "Test that the oldest unused responses are removed when the size limit is exceeded."
+
+    data = {"values": list(range(200))}
+    cache = ClimateCache(tmp_path)
+    cache.put("first", "{}", data)
+    entry_size = cache.size()
+    cache.max_bytes = 2 * entry_size
+
+    cache.put("second", "{}", data)
+    cache.get("first")
+    cache.put("third", "{}", data)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == data and cache.get("third") == data
+    assert cache.size() <= cache.max_bytes
@@ -0,0 +1,159 @@
+import json
+import threading
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock
+import pytest
+import requests
+from app.utils.climate_cache import ClimateCache
+from app.utils.climate_data_handler import ClimateDataHandler
+from app.utils.request_scheduler import RequestScheduler
+
+
+def archive_response(params):
+    "Return a fake archive response whose values are the year of each timestamp, with None on 1 January."
+    frequency = "daily" if "daily" in params else "hourly"
+    start = date.fromisoformat(params["start_date"])
+    end = date.fromisoformat(params["end_date"])
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    if frequency == "daily":
+        times = [day.isoformat() for day in days]
+    else:
+        times = [f"{day.isoformat()}T{hour:02d}:00" for day in days for hour in range(0, 24, 6)]
+    values = [None if time[5:10] == "01-01" else float(time[:4]) for time in times]
+
+    response = MagicMock(status_code=200)
+    response.json.return_value = {frequency: {"time": times, **{name: values for name in params[frequency].split(",")}}}
+    return response
+
+
+@pytest.fixture(autouse=True)
+def app_data(tmp_path, monkeypatch):
+    monkeypatch.setenv("MICROCLIMATE_DATA_DIR", str(tmp_path))
+
+
+@pytest.fixture
+def archive():
+    session = MagicMock()
+    session.get.side_effect = lambda url, params, timeout=None: archive_response(params)
+    return session
+
+
+def test_fetch_climate_data_uses_one_ranged_request_per_frequency(archive):
+    "Test that a daily and an hourly request cover the whole span and are split into years."
+
+    climate_data = ClimateDataHandler(session=archive).fetch_climate_data(40.0, -74.0, {2010, 2000, 2004})
+
+    assert archive.get.call_count == 2
+    dates = {(call.kwargs["params"]["start_date"], call.kwargs["params"]["end_date"]) for call in archive.get.call_args_list}
+    assert dates == {("2000-01-01", "2010-12-31")}
+    assert list(climate_data) == [2000, 2004, 2010]
+    for year, year_data in climate_data.items():
+        assert year_data["temperature_2m_max"] == year
+        assert year_data["direct_radiation"] == year
+
+
+def test_fetch_climate_data_failure_fills_none(archive):
+    "Test that a failed request leaves every parameter of every year empty."
+
+    archive.get.side_effect = requests.exceptions.ConnectionError("offline")
+    scheduler = RequestScheduler(archive, max_retries=0)
+
+    climate_data = ClimateDataHandler(session=archive, scheduler=scheduler).fetch_climate_data(40.0, -74.0, [2001, 2002])
+
+    assert set(climate_data) == {2001, 2002}
+    assert all(value is None for value in climate_data[2001].values())
+
+
+def test_fetch_locations_sends_requests_concurrently(archive):
+    "Test that independent requests are in flight together and results keep the location order."
+
+    in_flight = threading.Barrier(4, timeout=5)
+
+    def get(url, params, timeout=None):
+        in_flight.wait()
+        return archive_response(params)
+
+    archive.get.side_effect = get
+    handler = ClimateDataHandler(max_workers=4, session=archive)
+
+    results = handler.fetch_locations([(40.0, -74.0, [2001]), (35.0, -80.0, [2003, 2002])])
+
+    assert [list(result) for result in results] == [[2001], [2002, 2003]]
+    assert results[1][2003]["wind_speed_10m_max"] == 2003
+
+
+def test_create_session_pools_connections():
+    "Test that the default session keeps as many connections as there are workers."
+
+    handler = ClimateDataHandler(max_workers=3)
+    assert handler.session.get_adapter(handler.BASE_URL)._pool_maxsize == 3
+
+
+def test_repeated_fetch_is_served_from_cache(archive, tmp_path):
+    "Test that past years are fetched once and then read from the cache, also in offline mode."
+
+    cache = ClimateCache(tmp_path / "climate")
+    first = ClimateDataHandler(session=archive, cache=cache).fetch_climate_data(40.001, -74.0, [2001, 2003])
+    assert archive.get.call_count == 2
+
+    second = ClimateDataHandler(session=archive, cache=cache).fetch_climate_data(40.0, -74.0, [2001, 2003])
+    offline = ClimateDataHandler(session=archive, cache=cache, offline=True).fetch_climate_data(40.0, -74.0, [2001, 2003])
+
+    assert archive.get.call_count == 2
+    assert first == second == offline
+
+
+def test_offline_without_cached_data_sends_no_requests(archive):
+    "Test that offline mode leaves uncached years empty instead of downloading them."
+
+    climate_data = ClimateDataHandler(session=archive, offline=True).fetch_climate_data(40.0, -74.0, [2001])
+
+    archive.get.assert_not_called()
+    assert all(value is None for value in climate_data[2001].values())
+
+
+def test_current_year_is_not_cached(archive):
+    "Test that ranges reaching the current year are always downloaded."
+
+    handler = ClimateDataHandler(session=archive)
+    handler.fetch_climate_data(40.0, -74.0, [date.today().year])
+    handler.fetch_climate_data(40.0, -74.0, [date.today().year])
+
+    assert archive.get.call_count == 4
+
+
+def test_update_metadata_records_freshness(archive, tmp_path):
+    "Test that fetched years are recorded as fresh and only missing or stale years are fetched again."
+
+    images = {
+        "a.png": {"year": 2001},
+        "b.png": {"year": 2002},
+        "c.png": {"year": 2003, "climate": {"temperature_2m_max": 1.0}},
+    }
+    (tmp_path / "metadata.json").write_text(json.dumps({"images": images}))
+    handler = ClimateDataHandler(session=archive)
+    metadata = json.loads((tmp_path / "metadata.json").read_text())
+    assert handler.stale_years(metadata) == {2001, 2002, 2003}
+
+    climate_data = handler.fetch_climate_data(40.0, -74.0, {2001, 2003})
+    climate_data[2003] = {param: None for param in climate_data[2003]}
+    metadata = handler.update_metadata(tmp_path, climate_data, metadata)
+
+    assert metadata == json.loads((tmp_path / "metadata.json").read_text())
+    assert metadata["images"]["a.png"]["climate"]["temperature_2m_max"] == 2001
+    assert metadata["images"]["a.png"]["climate_record"]["source"] == handler.BASE_URL
+    assert handler.stale_years(metadata) == {2002, 2003}
+
+    handler.DAILY_PARAMS = handler.DAILY_PARAMS + ["precipitation_sum"]
+    assert handler.stale_years(metadata) == {2001, 2002, 2003}
+
+
+def test_climate_fetched_during_its_year_is_stale():
+    "Test that data fetched before the end of its year is fetched again."
+
+    handler = ClimateDataHandler(use_cache=False)
+    record = handler.climate_record()
+    year = datetime.fromisoformat(record["fetched_at"]).year
+
+    assert not handler.is_fresh({"year": year, "climate": {}, "climate_record": record})
+    assert handler.is_fresh({"year": year - 1, "climate": {}, "climate_record": record})
@@ -0,0 +1,38 @@
+import numpy as np
+from app.utils.crf_pool import CRFPool
+from app.utils.refinement import refine_probabilities
+
+
+def random_inputs(rng, height, width, num_classes=9):
+    "Create a random RGB image and matching softmax probabilities."
+
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    logits = rng.normal(size=(num_classes, height, width)).astype(np.float32)
+    probabilities = np.exp(logits) / np.exp(logits).sum(axis=0, keepdims=True)
+    return image, probabilities
+
+
+def test_crf_pool_matches_in_process_refinement_in_order():
+    "Test that worker processes return the same labels as in-process refinement, in submission order."
+
+    rng = np.random.default_rng(0)
+    inputs = [random_inputs(rng, 20 + i, 30 - i) for i in range(5)]
+    precomputed = np.full((4, 4), 7, dtype=np.uint8)
+
+    with CRFPool(workers=2, max_pending=2) as pool:
+        results = []
+        for index, (image, probabilities) in enumerate(inputs):
+            pool.submit(index, image, probabilities)
+            if index == 2:
+                pool.add_result("precomputed", precomputed)
+            results.extend(pool.results())
+        results.extend(pool.results(wait=True))
+
+    assert [key for key, _ in results] == [0, 1, 2, "precomputed", 3, 4]
+    for key, labels in results:
+        if key == "precomputed":
+            assert np.array_equal(labels, precomputed)
+            continue
+        image, probabilities = inputs[key]
+        expected = np.argmax(refine_probabilities(image, probabilities), axis=0)
+        assert np.array_equal(labels, expected)
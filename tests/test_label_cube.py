@@ -0,0 +1,82 @@
+import json
+import numpy as np
+from PIL import Image
+from app.model import colorize_segmentation, label_map_path, save_label_map
+from app.utils.label_cube import LabelCube, build_label_cube, cube_path
+
+
+def write_dataset(path, maps):
+    segmentations = path / "segmentations"
+    segmentations.mkdir()
+    images = {}
+    for year, labels in maps.items():
+        seg_path = segmentations / f"scene_{year}_seg.png"
+        seg_path.touch()
+        save_label_map(labels, label_map_path(seg_path))
+        images[f"scene_{year}.png"] = {"year": year}
+    (path / "metadata.json").write_text(json.dumps({"images": images}))
+
+
+def test_build_label_cube_chunks(tmp_path):
+    "Test that the cube holds every year of every pixel split into chunks."
+
+    rng = np.random.default_rng(0)
+    maps = {year: rng.integers(0, 9, (7, 5), dtype=np.uint8) for year in (2020, 2000, 2010)}
+    write_dataset(tmp_path, maps)
+
+    cube = build_label_cube(tmp_path, chunk_size=3)
+
+    assert cube.years == [2000, 2010, 2020]
+    assert cube.shape == (7, 5)
+    assert len(list(cube.chunks())) == 6
+    np.testing.assert_array_equal(cube.trajectory(6, 4), [maps[year][6, 4] for year in cube.years])
+
+
+def test_label_cube_trajectories(tmp_path):
+    "Test the first urbanized year and the number of class changes per pixel."
+
+    maps = {2000: np.full((4, 4), 5, np.uint8), 2010: np.full((4, 4), 5, np.uint8), 2020: np.full((4, 4), 5, np.uint8)}
+    maps[2010][0, 0] = 8
+    maps[2020][0, 0] = 2
+    maps[2020][3, 3] = 3
+    write_dataset(tmp_path, maps)
+
+    cube = build_label_cube(tmp_path, chunk_size=2)
+
+    first_year = cube.first_year_urbanized()
+    assert first_year[0, 0] == 2010 and first_year[3, 3] == 2020
+    assert (first_year > 0).sum() == 2
+    changes = cube.class_changes()
+    assert changes[0, 0] == 2 and changes[3, 3] == 1 and changes.sum() == 3
+
+
+def test_build_label_cube_reuses_current_cube(tmp_path):
+    "Test that the cube is only rebuilt when a label map changed."
+
+    maps = {2000: np.zeros((4, 4), np.uint8), 2010: np.ones((4, 4), np.uint8)}
+    write_dataset(tmp_path, maps)
+    build_label_cube(tmp_path, chunk_size=2)
+    index_mtime = (cube_path(tmp_path) / "cube.json").stat().st_mtime_ns
+
+    assert build_label_cube(tmp_path, chunk_size=2).years == [2000, 2010]
+    assert (cube_path(tmp_path) / "cube.json").stat().st_mtime_ns == index_mtime
+
+    save_label_map(np.full((4, 4), 2, np.uint8), tmp_path / "segmentations" / "scene_2010_seg.npy")
+    cube = build_label_cube(tmp_path, chunk_size=2)
+    assert isinstance(cube, LabelCube)
+    assert cube.trajectory(0, 0).tolist() == [0, 2]
+
+
+def test_build_label_cube_from_rgb_segmentations(tmp_path):
+    "Test that legacy RGB-only segmentations are decoded into the cube without leftover files."
+
+    maps = {2000: np.full((5, 6), 1, np.uint8), 2010: np.full((5, 6), 8, np.uint8)}
+    (tmp_path / "segmentations").mkdir()
+    for year, labels in maps.items():
+        Image.fromarray(colorize_segmentation(labels)).save(tmp_path / "segmentations" / f"scene_{year}_seg.png")
+    (tmp_path / "metadata.json").write_text(json.dumps({"images": {f"scene_{year}.png": {"year": year} for year in maps}}))
+
+    cube = build_label_cube(tmp_path, chunk_size=4)
+
+    assert cube.trajectory(4, 5).tolist() == [1, 8]
+    assert not list(cube_path(tmp_path).glob("labels_*.npy"))
@@ -0,0 +1,338 @@
+import json
+import shutil
+import threading
+import numpy as np
+import pytest
+import torch
+from pathlib import Path
+from PIL import Image
+from unittest.mock import MagicMock
+from transformers import SegformerImageProcessor
+import app.model as model_module
+from app.model import (
+    DEFAULT_TIER, MODEL_TIERS, LandCoverClass, ModelManager, calculate_class_percentages, colorize_segmentation,
+    get_model_tier, label_map_path, load_label_map, load_segmentation_labels, predict_logits, save_label_map,
+    save_segmentation_image, segment_tiled,
+)
+from app.utils.preprocessing import ImagePreprocessor
+
+
+@pytest.fixture
+def pretrained(monkeypatch, tmp_path):
+    "Fixture to replace the Hugging Face loaders with mocks."
+
+    model_loader = MagicMock(return_value="model")
+    processor_loader = MagicMock(return_value=SegformerImageProcessor())
+    monkeypatch.setattr(model_module.SegformerForSemanticSegmentation, "from_pretrained", model_loader)
+    monkeypatch.setattr(model_module.SegformerImageProcessor, "from_pretrained", processor_loader)
+    monkeypatch.setattr(model_module.SegformerConfig, "from_pretrained", MagicMock(return_value=MagicMock(_commit_hash="abc")))
+    monkeypatch.setenv("MICROCLIMATE_DATA_DIR", str(tmp_path))
+    return model_loader, processor_loader
+
+
+def test_model_manager_loads_once(pretrained):
+    "Test that the model is loaded in the background and kept for the session."
+
+    model_loader, processor_loader = pretrained
+    manager = ModelManager()
+    assert not manager.is_ready()
+
+    model, preprocessor = manager.wait_until_ready(timeout=5)
+    assert model == "model"
+    assert preprocessor.processor is processor_loader.return_value
+    assert manager.is_ready()
+    assert not manager.is_loading()
+
+    manager.start_loading()
+    manager.wait_until_ready(timeout=5)
+    model_loader.assert_called_once()
+    processor_loader.assert_called_once()
+
+
+def test_model_manager_reports_and_retries_errors(pretrained):
+    "Test that a failed load is reported and retried on the next request."
+
+    model_loader, _ = pretrained
+    model_loader.side_effect = [OSError("offline"), "model"]
+    manager = ModelManager()
+
+    with pytest.raises(RuntimeError, match="offline"):
+        manager.wait_until_ready(timeout=5)
+    assert not manager.is_ready()
+
+    assert manager.wait_until_ready(timeout=5)[0] == "model"
+
+
+def test_model_tiers(pretrained):
+    "Test that tiers are looked up in the registry and set the model input size."
+
+    manager = ModelManager(tier="fast")
+    _, preprocessor = manager.wait_until_ready(timeout=5)
+
+    assert manager.tier == MODEL_TIERS["fast"]
+    assert preprocessor.size == (MODEL_TIERS["fast"].input_size,) * 2
+    assert get_model_tier().name == DEFAULT_TIER
+    with pytest.raises(ValueError):
+        get_model_tier("tiny")
+
+
+def fake_pixel_model(images, return_tensors="pt"):
+    "Fake processor + model pair labelling each pixel Tree if red > 128, else Bareland."
+
+    pixel_values = torch.stack([torch.from_numpy(np.asarray(image)).permute(2, 0, 1).float() for image in images])
+    return {"pixel_values": pixel_values}
+
+
+def fake_logits(pixel_values):
+    tree = (pixel_values[:, 0] > 128).float()
+    logits = torch.zeros((pixel_values.shape[0], LandCoverClass.num_labels, *pixel_values.shape[2:]))
+    logits[:, 5] = tree * 10
+    logits[:, 1] = (1 - tree) * 10
+    return MagicMock(logits=logits)
+
+
+@pytest.mark.parametrize("blend", ["linear", "uniform"])
+def test_segment_tiled_stitches_full_scene(monkeypatch, blend):
+    "Test that tiles are stitched back into a label map matching a per-pixel segmentation."
+
+    monkeypatch.setattr(model_module, "refine_probabilities", lambda image, probabilities, **kwargs: probabilities)
+
+    rng = np.random.default_rng(0)
+    image = np.zeros((70, 95, 3), dtype=np.uint8)
+    image[..., 0] = rng.integers(0, 256, size=(70, 95))
+
+    labels = segment_tiled(image, fake_logits, fake_pixel_model, tile_size=32, overlap=8, blend=blend, batch_size=3)
+
+    expected = np.where(image[..., 0] > 128, 5, 1)
+    assert labels.shape == (70, 95)
+    assert np.array_equal(labels, expected)
+
+
+@pytest.fixture
+def dataset(monkeypatch, tmp_path):
+    "Fixture creating a small dataset segmented by the fake per-pixel model."
+
+    monkeypatch.setenv("MICROCLIMATE_DATA_DIR", str(tmp_path / "app_data"))
+    manager = MagicMock(backend="eager")
+    manager.wait_until_ready.return_value = (lambda pixel_values: fake_logits(pixel_values), fake_pixel_model)
+    manager.fingerprint.return_value = "fake@0"
+    monkeypatch.setattr(model_module, "model_manager", manager)
+
+    (tmp_path / "images").mkdir()
+    rng = np.random.default_rng(0)
+    for year in range(2000, 2004):
+        Image.fromarray(rng.integers(0, 256, size=(16, 16, 3), dtype=np.uint8)).save(tmp_path / "images" / f"{year}.png")
+    metadata = {"images": {f"{year}.png": {"year": year} for year in range(2000, 2004)}}
+    (tmp_path / "metadata.json").write_text(json.dumps(metadata))
+    return tmp_path
+
+
+def test_generate_segmentation_maps_reports_progress(dataset):
+    "Test that progress is reported once per written image."
+
+    progress = MagicMock()
+    model_module.generate_segmentation_maps(dataset, batch_size=2, crf_workers=0, engine="guided", progress=progress)
+
+    assert [call.args[:2] for call in progress.call_args_list] == [(done, 4) for done in range(1, 5)]
+    assert all(Path(call.args[3]).exists() for call in progress.call_args_list)
+
+
+def test_generate_segmentation_maps_skips_nodata(dataset):
+    "Test that transparent borders are labelled background and left out of the frequencies."
+
+    rgba = np.zeros((16, 16, 4), dtype=np.uint8)
+    rgba[4:12, 4:12] = (200, 0, 0, 255)
+    Image.fromarray(rgba, mode="RGBA").save(dataset / "images" / "2000.png")
+    Image.fromarray(np.zeros((16, 16, 4), dtype=np.uint8), mode="RGBA").save(dataset / "images" / "2001.png")
+
+    model_module.generate_segmentation_maps(dataset, batch_size=1, crf_workers=0, engine="guided")
+
+    labels = load_label_map(dataset / "segmentations" / "2000_seg.npy")
+    assert np.all(labels[4:12, 4:12] == 5)
+    assert labels[:4].sum() == 0
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    assert metadata["images"]["2000.png"]["freq"][4] == 1.0
+    assert sum(metadata["images"]["2001.png"]["freq"]) == 0
+
+
+def test_cache_hit_rewrites_outputs_of_replaced_image(dataset):
+    "Test that a replaced image served from the cache gets its outputs rewritten."
+
+    Image.fromarray(np.zeros((16, 16, 3), dtype=np.uint8)).save(dataset / "images" / "2000.png")
+    model_module.generate_segmentation_maps(dataset, batch_size=1, crf_workers=0, engine="guided", incremental=True)
+    assert np.all(load_label_map(dataset / "segmentations" / "2000_seg.npy") == 1)
+
+    other = dataset / "other"
+    (other / "images").mkdir(parents=True)
+    Image.fromarray(np.full((16, 16, 3), 255, dtype=np.uint8)).save(other / "images" / "2000.png")
+    (other / "metadata.json").write_text(json.dumps({"images": {"2000.png": {"year": 2000}}}))
+    model_module.generate_segmentation_maps(other, batch_size=1, crf_workers=0, engine="guided")
+
+    shutil.copy(other / "images" / "2000.png", dataset / "images" / "2000.png")
+    model_module.generate_segmentation_maps(dataset, batch_size=1, crf_workers=0, engine="guided", incremental=True)
+
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    assert metadata["images"]["2000.png"]["freq"][4] == 1.0
+    assert np.all(load_label_map(dataset / "segmentations" / "2000_seg.npy") == 5)
+    assert np.all(np.array(Image.open(dataset / "segmentations" / "2000_seg.png")) == 5)
+
+
+def test_incremental_segments_images_missing_frequencies(dataset):
+    "Test that an image segmented before it had a metadata entry gets its frequencies on the next run."
+
+    (dataset / "metadata.json").write_text(json.dumps({"images": {"2000.png": {"year": 2000}}}))
+    model_module.generate_segmentation_maps(dataset, batch_size=2, crf_workers=0, engine="guided", incremental=True)
+    assert (dataset / "segmentations" / "2001_seg.npy").exists()
+
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    metadata["images"]["2001.png"] = {"year": 2001}
+    (dataset / "metadata.json").write_text(json.dumps(metadata))
+    model_module.generate_segmentation_maps(dataset, batch_size=2, crf_workers=0, engine="guided", incremental=True)
+
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    assert len(metadata["images"]["2001.png"]["freq"]) == LandCoverClass.num_labels - 1
+
+
+def test_frequencies_are_merged_into_metadata(dataset):
+    "Test that segmentation keeps the other fields of an image entry, such as climate data."
+
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    metadata["images"]["2000.png"].update({"climate": {"temperature_2m_max": 20.0}, "climate_record": {"source": "x"}})
+    (dataset / "metadata.json").write_text(json.dumps(metadata))
+
+    model_module.generate_segmentation_maps(dataset, batch_size=2, crf_workers=0, engine="guided")
+
+    entry = json.loads((dataset / "metadata.json").read_text())["images"]["2000.png"]
+    assert entry["climate"] == {"temperature_2m_max": 20.0}
+    assert entry["climate_record"] == {"source": "x"}
+    assert entry["year"] == 2000 and "freq" in entry
+
+
+def test_generate_segmentation_maps_cancel(dataset):
+    "Test that a cancelled run stops without losing the existing metadata."
+
+    cancel = threading.Event()
+    cancel.set()
+    model_module.generate_segmentation_maps(dataset, crf_workers=0, engine="guided", cancel=cancel)
+
+    metadata = json.loads((dataset / "metadata.json").read_text())
+    assert metadata["images"]["2000.png"] == {"year": 2000}
+    assert not list((dataset / "segmentations").glob("*_seg.png"))
+
+
+def test_predict_logits_mixed_size_batch_matches_single_images():
+    "Test that a batch of differently sized images returns one logits tensor per image, in order."
+
+    torch.manual_seed(0)
+    conv = torch.nn.Conv2d(3, LandCoverClass.num_labels, kernel_size=4, stride=4)
+    model = lambda pixel_values: MagicMock(logits=conv(pixel_values))
+    preprocessor = ImagePreprocessor(size=(32, 32))
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, size=shape, dtype=np.uint8) for shape in ((16, 16, 3), (40, 24, 3), (8, 30, 3))]
+
+    with torch.no_grad():
+        batched = predict_logits(images, model, preprocessor)
+        single = [predict_logits([image], model, preprocessor)[0] for image in images]
+
+    assert len(batched) == len(images)
+    for logits, expected in zip(batched, single):
+        assert logits.shape == (1, LandCoverClass.num_labels, 8, 8)
+        assert torch.allclose(logits, expected, atol=1e-5)
+    assert not torch.allclose(batched[0], batched[1])
+
+
+def test_predict_logits_bfloat16_returns_float32():
+    "Test that autocast inference hands float32 logits on to softmax and refinement."
+
+    torch.manual_seed(0)
+    conv = torch.nn.Conv2d(3, LandCoverClass.num_labels, kernel_size=3, padding=1)
+    model = lambda pixel_values: MagicMock(logits=conv(pixel_values / 255))
+    images = [np.random.default_rng(0).integers(0, 256, size=(16, 16, 3), dtype=np.uint8)]
+
+    with torch.no_grad():
+        reference = predict_logits(images, model, fake_pixel_model)[0]
+        reduced = predict_logits(images, model, fake_pixel_model, precision="bfloat16")[0]
+
+    assert reduced.dtype == torch.float32
+    assert torch.allclose(reduced, reference, atol=0.05)
+    with pytest.raises(ValueError):
+        predict_logits(images, model, fake_pixel_model, precision="float16")
+
+
+def test_segment_tiled_skips_nodata_tiles(monkeypatch):
+    "Test that tiles that are entirely no-data never reach the model."
+
+    monkeypatch.setattr(model_module, "refine_probabilities", lambda image, probabilities, **kwargs: probabilities)
+    model = MagicMock(side_effect=fake_logits)
+    image = np.full((64, 64, 3), 200, dtype=np.uint8)
+    nodata = np.ones((64, 64), dtype=bool)
+    nodata[:32, :32] = False
+
+    labels = segment_tiled(image, model, fake_pixel_model, tile_size=32, overlap=0, nodata=nodata)
+
+    assert sum(call.kwargs["pixel_values"].shape[0] for call in model.call_args_list) == 1
+    assert np.all(labels[:32, :32] == 5)
+
+
+def test_segment_tiled_rejects_bad_overlap():
+    "Test that an overlap at least as large as the tile is rejected."
+
+    with pytest.raises(ValueError):
+        segment_tiled(np.zeros((8, 8, 3), dtype=np.uint8), None, None, tile_size=16, overlap=16)
+
+
+def test_segmentation_image_round_trip(tmp_path):
+    "Test that palette PNGs keep the land cover colours and class IDs."
+
+    labels = np.arange(LandCoverClass.num_labels, dtype=np.uint8).repeat(4).reshape(6, 6)
+    output_path = tmp_path / "image_seg.png"
+    save_segmentation_image(labels, output_path)
+
+    image = Image.open(output_path)
+    assert image.mode == "P"
+    assert np.array_equal(np.array(image.convert("RGB")), colorize_segmentation(labels))
+    assert np.array_equal(load_segmentation_labels(output_path), labels)
+
+
+def test_label_map_is_memory_mapped(tmp_path):
+    "Test that raw label maps are read back zero-copy and preferred over decoding the PNG."
+
+    labels = np.arange(LandCoverClass.num_labels, dtype=np.uint8).repeat(4).reshape(6, 6)
+    output_path = tmp_path / "image_seg.png"
+    Image.new("P", (6, 6)).save(output_path)
+    save_label_map(labels, label_map_path(output_path))
+
+    loaded = load_label_map(label_map_path(output_path))
+    assert isinstance(loaded, np.memmap)
+    assert loaded.dtype == np.uint8
+    assert np.array_equal(load_segmentation_labels(output_path), labels)
+
+
+def test_load_segmentation_labels_from_rgb(tmp_path):
+    "Test that RGB segmentation files written by older versions are still readable."
+
+    labels = np.arange(LandCoverClass.num_labels, dtype=np.uint8).repeat(4).reshape(6, 6)
+    output_path = tmp_path / "image_seg.png"
+    Image.fromarray(colorize_segmentation(labels)).save(output_path)
+
+    assert np.array_equal(load_segmentation_labels(output_path), labels)
+
+
+def test_calculate_class_percentages_excludes_nodata():
+    "Test that no-data pixels are left out of the frequency denominator."
+
+    labels = np.array([[0, 1, 1, 8], [5, 5, 5, 3]], dtype=np.uint8)
+    valid = np.array([[False, True, True, True], [True, True, True, False]])
+
+    result = calculate_class_percentages(labels, "image.png", valid)
+    assert result["label_freq"] == [2 / 6, 0, 0, 0, 3 / 6, 0, 0, 1 / 6]
+
+
+def test_calculate_class_percentages():
+    "Test that class frequencies exclude the background class and sum with it to one."
+
+    labels = np.array([[0, 1, 1, 8], [5, 5, 5, 3]], dtype=np.uint8)
+    result = calculate_class_percentages(labels, "image.png")
+
+    assert result["image_filename"] == "image.png"
+    assert result["label_freq"] == [0.25, 0, 0.125, 0, 0.375, 0, 0, 0.125]
@@ -0,0 +1,150 @@
+import pytest
+import torch
+from types import SimpleNamespace
+from transformers import SegformerConfig, SegformerForSemanticSegmentation, SegformerImageProcessor
+from unittest.mock import MagicMock
+import app.model as model_module
+import app.utils.model_export as model_export_module
+from app.model import ModelManager
+from app.utils.model_export import (
+    QUANTIZED_MIN_AGREEMENT, ExportedModel, disable_exported_model, export_model, find_exported_model, verify_export,
+)
+
+
+class TinySegmenter(torch.nn.Module):
+    "Small stand-in with the Hugging Face call signature."
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.conv = torch.nn.Conv2d(3, 9, kernel_size=4, stride=4)
+
+    def forward(self, pixel_values):
+        return SimpleNamespace(logits=self.conv(pixel_values))
+
+
+def tiny_segformer():
+    "Randomly initialised SegFormer small enough to export in a test."
+    torch.manual_seed(0)
+    config = SegformerConfig(
+        num_encoder_blocks=2, depths=[1, 1], sr_ratios=[2, 1], hidden_sizes=[8, 16],
+        num_attention_heads=[1, 2], decoder_hidden_size=16, num_labels=9,
+    )
+    return SegformerForSemanticSegmentation(config).eval()
+
+
+def test_torchscript_export_matches_eager(tmp_path):
+    "Test that the exported model returns the eager logits for any batch size."
+
+    model = TinySegmenter()
+    path = export_model(model, "model@abc", backend="torchscript", directory=tmp_path)
+    exported = ExportedModel(path, "torchscript")
+
+    pixel_values = torch.rand(3, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.allclose(exported(pixel_values=pixel_values).logits, model(pixel_values).logits, atol=1e-5)
+
+
+def test_onnx_export_of_segformer_matches_eager(tmp_path):
+    "Test that the ONNX export of a real SegFormer reproduces the eager logits for any batch size."
+
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnxscript")
+    model = tiny_segformer()
+    path = export_model(model, "model@abc", backend="onnx", directory=tmp_path)
+    exported = ExportedModel(path, "onnx")
+
+    for batch_size in (1, 3):
+        pixel_values = torch.randn(batch_size, 3, 512, 512)
+        with torch.no_grad():
+            expected = model(pixel_values=pixel_values).logits
+        assert torch.allclose(exported(pixel_values=pixel_values).logits, expected, atol=1e-4)
+    assert find_exported_model("model@abc", tmp_path) == (path, "onnx", False)
+
+
+def test_int8_torchscript_export_of_segformer(monkeypatch, tmp_path):
+    "Test that int8 TorchScript export replaces the Linear layers and still agrees with the eager argmax."
+
+    quantize_dynamic = torch.ao.quantization.quantize_dynamic
+    quantized_models = []
+    monkeypatch.setattr(
+        model_export_module.torch.ao.quantization, "quantize_dynamic",
+        lambda *args, **kwargs: quantized_models.append(quantize_dynamic(*args, **kwargs)) or quantized_models[-1],
+    )
+    model = tiny_segformer()
+
+    path = export_model(model, "model@abc", backend="torchscript", quantize=True, directory=tmp_path)
+
+    modules = list(quantized_models[0].modules())
+    assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in modules)
+    assert not any(type(module) is torch.nn.Linear for module in modules)
+    difference, agreement = verify_export(model, path, "torchscript", quantize=True)
+    assert difference > 0
+    assert agreement >= QUANTIZED_MIN_AGREEMENT
+
+
+def test_int8_onnx_export_of_segformer(tmp_path):
+    "Test that int8 ONNX export quantizes the matrix multiplications and still agrees with the eager argmax."
+
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnxscript")
+    model = tiny_segformer()
+
+    path = export_model(model, "model@abc", backend="onnx", quantize=True, directory=tmp_path)
+
+    operators = {node.op_type for node in onnx.load(str(path)).graph.node}
+    assert "MatMulInteger" in operators or "DynamicQuantizeMatMul" in operators
+    difference, agreement = verify_export(model, path, "onnx", quantize=True)
+    assert difference > 0
+    assert agreement >= QUANTIZED_MIN_AGREEMENT
+    assert find_exported_model("model@abc", tmp_path) == (path, "onnx", True)
+
+
+def test_mismatching_export_is_not_activated(monkeypatch, tmp_path):
+    "Test that an export whose logits differ from the eager model is deleted and not activated."
+
+    trace = torch.jit.trace
+    other = TinySegmenter()
+    with torch.no_grad():
+        other.conv.weight.add_(1.0)
+    monkeypatch.setattr(
+        model_export_module.torch.jit, "trace",
+        lambda module, example, **kwargs: trace(model_export_module._LogitsOnly(other), example, **kwargs),
+    )
+
+    with pytest.raises(RuntimeError, match="does not match"):
+        export_model(TinySegmenter(), "model@abc", backend="torchscript", directory=tmp_path)
+
+    assert find_exported_model("model@abc", tmp_path) is None
+    assert not list(tmp_path.glob("*.pt"))
+
+
+def test_active_export_matches_fingerprint(tmp_path):
+    "Test that only an export of the same weights is picked up, and that it can be disabled."
+
+    path = export_model(TinySegmenter(), "model@abc", backend="torchscript", directory=tmp_path)
+
+    assert find_exported_model("model@abc", tmp_path) == (path, "torchscript", False)
+    assert find_exported_model("model@def", tmp_path) is None
+
+    disable_exported_model(tmp_path)
+    assert find_exported_model("model@abc", tmp_path) is None
+
+
+def test_model_manager_uses_active_export(monkeypatch, tmp_path):
+    "Test that the model manager loads the active export instead of the eager model."
+
+    monkeypatch.setenv("MICROCLIMATE_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(model_module.SegformerConfig, "from_pretrained", MagicMock(return_value=MagicMock(_commit_hash="abc")))
+    monkeypatch.setattr(model_module.SegformerImageProcessor, "from_pretrained", MagicMock(return_value=SegformerImageProcessor()))
+    model_loader = MagicMock()
+    monkeypatch.setattr(model_module.SegformerForSemanticSegmentation, "from_pretrained", model_loader)
+
+    export_model(TinySegmenter(), f"{model_module.MODEL_ID}@abc", backend="torchscript")
+    manager = ModelManager()
+    model, _ = manager.wait_until_ready(timeout=30)
+
+    assert isinstance(model, ExportedModel)
+    assert manager.backend == "torchscript"
+    model_loader.assert_not_called()
@@ -0,0 +1,63 @@
+import pytest
+import torch
+from unittest.mock import MagicMock
+from transformers import SegformerConfig, SegformerForSemanticSegmentation, SegformerImageProcessor
+import app.model as model_module
+from app.model import MODEL_ID, PROCESSOR_ID, ModelManager
+from app.utils.model_store import find_local_model, import_model, load_local_model, remove_local_model
+
+
+@pytest.fixture
+def tiny_model():
+    "Fixture providing a small randomly initialised SegFormer and the default processor."
+
+    torch.manual_seed(0)
+    config = SegformerConfig(
+        num_labels=9, hidden_sizes=[8, 16, 16, 32], decoder_hidden_size=16,
+        depths=[1, 1, 1, 1], num_attention_heads=[1, 1, 1, 1],
+    )
+    return SegformerForSemanticSegmentation(config).eval(), SegformerImageProcessor()
+
+
+def test_local_model_matches_original(tmp_path, tiny_model):
+    "Test that the stored model produces the original logits from memory-mapped weights."
+
+    model, processor = tiny_model
+    import_model(model, processor, MODEL_ID, PROCESSOR_ID, "abc", directory=tmp_path)
+
+    loaded = load_local_model(tmp_path)
+    pixel_values = torch.rand(2, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.equal(loaded(pixel_values=pixel_values).logits, model(pixel_values=pixel_values).logits)
+    assert all(not parameter.is_meta for parameter in loaded.parameters())
+
+
+def test_find_local_model_checks_ids(tmp_path, tiny_model):
+    "Test that the store is only used for the model and processor it was imported from."
+
+    import_model(*tiny_model, MODEL_ID, PROCESSOR_ID, "abc", directory=tmp_path)
+
+    assert find_local_model(MODEL_ID, PROCESSOR_ID, tmp_path)["commit_hash"] == "abc"
+    assert find_local_model("other/model", PROCESSOR_ID, tmp_path) is None
+
+    remove_local_model(tmp_path)
+    assert find_local_model(MODEL_ID, PROCESSOR_ID, tmp_path) is None
+
+
+def test_model_manager_loads_offline_from_store(monkeypatch, tmp_path, tiny_model):
+    "Test that the model manager loads an imported model without contacting the hub."
+
+    monkeypatch.setenv("MICROCLIMATE_DATA_DIR", str(tmp_path))
+    import_model(*tiny_model, MODEL_ID, PROCESSOR_ID, "abc")
+
+    hub_error = MagicMock(side_effect=OSError("offline"))
+    for name in ("SegformerConfig", "SegformerForSemanticSegmentation", "SegformerImageProcessor"):
+        monkeypatch.setattr(model_module, name, MagicMock(from_pretrained=hub_error))
+
+    manager = ModelManager()
+    model, processor = manager.wait_until_ready(timeout=30)
+
+    assert isinstance(model, SegformerForSemanticSegmentation)
+    assert isinstance(processor.processor, SegformerImageProcessor)
+    assert manager.fingerprint() == f"{MODEL_ID}@abc"
+    hub_error.assert_not_called()
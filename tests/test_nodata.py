@@ -0,0 +1,44 @@
+import numpy as np
+from PIL import Image
+from app.utils.nodata import NoDataRegion, paste_labels, read_image, valid_bounds
+
+
+def test_read_image_masks_transparent_and_nodata_colour(tmp_path):
+    "Test that fully transparent and nodata-coloured pixels are marked as no-data."
+
+    rgba = np.full((6, 8, 4), 200, dtype=np.uint8)
+    rgba[:2, :, 3] = 0
+    rgba[:, 6:, :3] = 0
+    path = tmp_path / "scene.png"
+    Image.fromarray(rgba, mode="RGBA").save(path)
+
+    rgb, region = read_image(path)
+    assert rgb.shape == (6, 8, 3)
+    assert region.mask.sum() == 16
+    assert region.bounds == (2, 6, 0, 8)
+
+    _, region = read_image(path, nodata_color=(0, 0, 0))
+    assert region.bounds == (2, 6, 0, 6)
+
+
+def test_read_image_without_nodata(tmp_path):
+    "Test that opaque images have no no-data region."
+
+    path = tmp_path / "scene.png"
+    Image.fromarray(np.full((4, 4, 4), 255, dtype=np.uint8), mode="RGBA").save(path)
+
+    assert read_image(path)[1] is None
+
+
+def test_paste_labels_restores_full_size():
+    "Test that labels of the cropped valid area are placed back with no-data set to background."
+
+    mask = np.ones((5, 5), dtype=bool)
+    mask[1:3, 2:4] = False
+    bounds = valid_bounds(mask)
+    assert bounds == (1, 3, 2, 4)
+
+    labels = paste_labels(np.full((2, 2), 5, dtype=np.uint8), NoDataRegion(mask, bounds, mask.shape))
+    assert labels.sum() == 5 * 4
+    assert np.array_equal(labels != 0, ~mask)
+    assert valid_bounds(np.ones((3, 3), dtype=bool)) is None
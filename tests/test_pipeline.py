@@ -0,0 +1,36 @@
+import pytest
+from app.utils.pipeline import Pipeline
+
+
+def test_pipeline_runs_stages_in_order():
+    "Test that items flow through every stage in order and are counted in the report."
+
+    pipeline = Pipeline()
+    doubled = pipeline.queue("doubled", 2)
+    results = []
+
+    pipeline.start_stage("double", lambda item: item * 2, range(10), outbox=doubled)
+    pipeline.start_stage("collect", results.append, doubled)
+    pipeline.join()
+
+    assert results == [item * 2 for item in range(10)]
+    assert [timer.items for timer in pipeline.timers] == [10, 10]
+    assert 1 <= pipeline.queues[0].max_depth <= 2
+    assert "doubled" in pipeline.report()
+
+
+def test_pipeline_stops_all_stages_on_error():
+    "Test that a failing stage unblocks the other stages and its error is re-raised."
+
+    def fail_on_three(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    pipeline = Pipeline()
+    passed = pipeline.queue("passed", 1)
+    pipeline.start_stage("produce", lambda item: item, range(1000), outbox=passed)
+    pipeline.start_stage("check", fail_on_three, passed)
+
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.join()
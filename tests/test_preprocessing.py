@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from transformers import SegformerImageProcessor
+from app.utils.preprocessing import ImagePreprocessor
+
+
+@pytest.fixture
+def processors():
+    "Fixture providing the Hugging Face processor and its vectorized equivalent."
+
+    processor = SegformerImageProcessor(size={"height": 64, "width": 64})
+    return processor, ImagePreprocessor.from_processor(processor)
+
+
+def random_image(height, width, channels=3, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(height, width, channels), dtype=np.uint8)
+
+
+def test_preprocessing_matches_processor_for_mixed_batch(processors):
+    "Test that a batch of differently sized PIL images and arrays matches the processor output."
+
+    processor, preprocessor = processors
+    images = [Image.fromarray(random_image(100, 80)), random_image(64, 64, seed=1), random_image(30, 150, seed=2)]
+
+    expected = processor(images=images, return_tensors="pt")["pixel_values"]
+    result = preprocessor(images=images, return_tensors="pt")["pixel_values"]
+
+    assert result.shape == expected.shape == (3, 3, 64, 64)
+    assert result.dtype == torch.float32
+    assert torch.allclose(result, expected, atol=1e-5)
+
+
+def test_preprocessing_converts_rgba_and_grayscale(processors):
+    "Test that RGBA and grayscale images are converted to RGB like the processor does."
+
+    processor, preprocessor = processors
+    rgba = Image.fromarray(random_image(48, 48, channels=4), mode="RGBA")
+    gray = Image.fromarray(random_image(48, 48, channels=1)[..., 0], mode="L")
+
+    for image in (rgba, gray):
+        expected = processor(images=image.convert("RGB"), return_tensors="pt")["pixel_values"]
+        assert torch.allclose(preprocessor(images=image)["pixel_values"], expected, atol=1e-5)
+        assert torch.allclose(preprocessor(images=np.asarray(image))["pixel_values"], expected, atol=1e-5)
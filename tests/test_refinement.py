@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from app.utils.refinement import (
+    ENGINES, UPSAMPLE_MODES, GuidedFilterEngine, _box_sum, get_engine, refine_to_labels, resize_image,
+)
+
+
+def two_region_scene(size=64):
+    "Return an image split into a dark and a bright half with soft probabilities favouring each half's class."
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    image[:, size // 2:] = 255
+    probabilities = np.full((9, size, size), 0.02, dtype=np.float32)
+    probabilities[1, :, :size // 2], probabilities[5, :, :size // 2] = 0.6, 0.26
+    probabilities[1, :, size // 2:], probabilities[5, :, size // 2:] = 0.26, 0.6
+    return image, probabilities
+
+
+def test_box_sum_matches_naive_window_sum():
+    "Test the integral-image box filter against explicit window sums, including borders."
+
+    x = np.random.default_rng(0).random((7, 9)).astype(np.float32)
+    radius = 2
+    expected = np.array([
+        [x[max(0, i - radius):i + radius + 1, max(0, j - radius):j + radius + 1].sum() for j in range(9)]
+        for i in range(7)
+    ])
+    assert np.allclose(_box_sum(x, radius), expected, atol=1e-5)
+
+
+def test_guided_engine_snaps_probabilities_to_image_edges():
+    "Test that blurry class boundaries are pulled onto the edge in the guide image."
+
+    image = np.zeros((40, 40, 3), dtype=np.uint8)
+    image[:, 20:] = 255
+
+    # Probabilities whose boundary is smeared and shifted four pixels to the right of the edge
+    ramp = np.clip((np.arange(40) - 16) / 16 + 0.5, 0, 1)
+    probabilities = np.zeros((9, 40, 40), dtype=np.float32)
+    probabilities[1] = 1 - ramp
+    probabilities[5] = ramp
+
+    labels = refine_to_labels(image, probabilities, engine="guided")
+
+    assert np.all(labels[:, :20] == 1)
+    assert np.all(labels[:, 20:] == 5)
+    assert not np.all(np.argmax(probabilities, axis=0)[:, :20] == 1)
+
+
+def test_guided_engine_is_always_available():
+    "Test that segmentation has an engine to fall back on without pydensecrf."
+
+    assert get_engine("guided").is_available()
+    assert isinstance(ENGINES["guided"], GuidedFilterEngine)
+
+
+def test_unknown_engine_is_rejected():
+    "Test that selecting an unregistered engine raises a clear error."
+
+    with pytest.raises(ValueError, match="Unknown refinement engine"):
+        get_engine("does-not-exist")
+
+
+@pytest.mark.parametrize("engine", ["guided", "densecrf"])
+@pytest.mark.parametrize("upsample", UPSAMPLE_MODES)
+def test_downscaled_refinement_matches_full_resolution(engine, upsample):
+    "Test that refining at half resolution returns full-size labels matching full-resolution ones off the boundary."
+
+    if not ENGINES[engine].is_available():
+        pytest.skip(f"{engine} is not installed")
+    image, probabilities = two_region_scene()
+    full = refine_to_labels(image, probabilities, engine=engine)
+
+    labels = refine_to_labels(
+        resize_image(image, (32, 32)), probabilities[:, ::2, ::2], output_size=(64, 64), upsample=upsample, engine=engine
+    )
+
+    assert labels.shape == (64, 64) and labels.dtype == np.uint8
+    away_from_boundary = np.r_[0:28, 36:64]
+    assert np.array_equal(labels[:, away_from_boundary], full[:, away_from_boundary])
+    assert np.all(labels[:, :28] == 1) and np.all(labels[:, 36:] == 5)
+
+
+def test_downscaled_refinement_scales_kernels(monkeypatch):
+    "Test that the engine is told the working resolution relative to the output size."
+
+    scales = []
+    engine = GuidedFilterEngine()
+    refine = engine.refine
+    monkeypatch.setattr(engine, "refine", lambda image, probabilities, scale=1.0: scales.append(scale) or refine(image, probabilities, scale))
+    monkeypatch.setitem(ENGINES, "guided", engine)
+    image, probabilities = two_region_scene()
+
+    refine_to_labels(resize_image(image, (16, 16)), probabilities[:, ::4, ::4], output_size=(64, 64), engine="guided")
+
+    assert scales == [0.25]
+
+
+def test_unknown_upsample_mode_is_rejected():
+    "Test that an unsupported upsample mode raises before refining."
+
+    image, probabilities = two_region_scene(8)
+    with pytest.raises(ValueError, match="Unknown upsample mode"):
+        refine_to_labels(image, probabilities, output_size=(16, 16), upsample="bicubic")
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.utils.climate_data_handler import ClimateDataHandler
+from app.utils.request_scheduler import RequestScheduler, TokenBucket
+
+
+class StubArchive(ThreadingHTTPServer):
+    "Local HTTP server answering with a scripted list of (status, headers, body, delay) replies."
+
+    def __init__(self, replies):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.replies = list(replies)
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/archive"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, headers, body, delay = self.server.replies.pop(0) if self.server.replies else (200, {}, {}, 0)
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_archive():
+    servers = []
+
+    def start(replies):
+        server = StubArchive(replies)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retries_throttled_and_failed_responses(stub_archive):
+    "Test that 429 and 5xx replies are retried, waiting for Retry-After when it is given."
+
+    server = stub_archive([(429, {"Retry-After": "3"}, {}, 0), (503, {}, {}, 0), (200, {}, {"ok": True}, 0)])
+    sleeps = []
+    scheduler = RequestScheduler(requests.Session(), backoff_base=0.25, sleep=sleeps.append)
+
+    response = scheduler.get(server.url, params={"latitude": 1})
+
+    assert response.json() == {"ok": True}
+    assert len(server.requests) == 3
+    assert sleeps[0] == pytest.approx(3, abs=0.1)
+    assert 0 <= sleeps[1] <= 0.5
+
+
+def test_returns_last_error_after_max_retries(stub_archive):
+    "Test that a persistent error is returned once the retries are used up."
+
+    server = stub_archive([(500, {}, {}, 0)] * 3)
+    scheduler = RequestScheduler(requests.Session(), max_retries=2, sleep=lambda seconds: None)
+
+    assert scheduler.get(server.url).status_code == 500
+    assert len(server.requests) == 3
+
+
+def test_timeout_is_retried(stub_archive):
+    "Test that a request exceeding its timeout is sent again."
+
+    server = stub_archive([(200, {}, {"slow": True}, 1.0), (200, {}, {"slow": False}, 0)])
+    scheduler = RequestScheduler(requests.Session(), timeout=0.2, sleep=lambda seconds: None)
+
+    assert scheduler.get(server.url).json() == {"slow": False}
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    "Test that requests beyond the burst wait for the bucket to refill."
+
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0], sleep=waits.append)
+
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    bucket.pause(1.5)
+    assert bucket.acquire() == 1.5
+    assert waits == [0.5, 1.0, 1.5]
+
+
+def test_climate_fetch_recovers_from_throttling(stub_archive, tmp_path):
+    "Test that the climate handler gets complete data from an archive that throttles at first."
+
+    daily = {"daily": {"time": ["2001-01-01", "2001-01-02"], "temperature_2m_max": [1.0, 3.0]}}
+    server = stub_archive([(429, {"Retry-After": "0"}, {}, 0), (200, {}, daily, 0), (200, {}, {"hourly": {}}, 0)])
+    handler = ClimateDataHandler(max_workers=1, use_cache=False)
+    handler.BASE_URL = server.url
+
+    climate_data = handler.fetch_climate_data(40.0, -74.0, [2001])
+
+    assert climate_data[2001]["temperature_2m_max"] == 2.0
+    assert len(server.requests) == 3
@@ -1,9 +1,10 @@
 import os
+import time
 import pytest
 from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QGridLayout, QLabel
 from PyQt5.uic import loadUi
 from unittest.mock import MagicMock
-from app.controllers.segment_data_controller import SegmentDataController
+from app.controllers.segment_data_controller import SegmentationThread, SegmentDataController
 from app.utils.alert_handler import AlertHandler
 
 
@@ -223,4 +224,39 @@ def test_add_remove_readd_images(segment_data_controller):
 
     controller.add_images_from_dataset()
     assert "image_2.jpg" in controller.image_paths
-    assert scroll_area.layout().count() == 1
\ No newline at end of file
+    assert scroll_area.layout().count() == 1
+
+
+def test_segmentation_results_stream_in(segment_data_controller):
+    "Test that each segmented image is shown as soon as the thread reports it."
+
+    controller = segment_data_controller
+    controller.image_paths = ["uploads/image_1.jpg", "uploads/image_2.jpg"]
+    controller.image_display_handler.create_image_widget = MagicMock(side_effect=lambda path: QLabel(path))
+    controller._results_shown = False
+
+    controller.on_image_segmented("dataset/images/image_2.jpg", "dataset/segmentations/image_2_seg.png")
+
+    layout = controller.ui.segmentScrollAreaContents.layout()
+    assert layout.count() == 1
+    shown = [call.args[0] for call in controller.image_display_handler.create_image_widget.call_args_list]
+    assert shown == ["uploads/image_2.jpg", "dataset/segmentations/image_2_seg.png"]
+
+
+def test_segmentation_thread_progress_and_cancel():
+    "Test that progress carries an ETA and that cancel is passed on to the segmentation run."
+
+    thread = SegmentationThread("dataset")
+    progress = MagicMock()
+    thread.progress.connect(progress)
+    thread._start = time.perf_counter() - 10
+
+    thread._on_progress(2, 6, "image.jpg", "image_seg.png")
+
+    done, total, eta = progress.call_args.args
+    assert (done, total) == (2, 6)
+    assert eta == pytest.approx(20, rel=0.1)
+
+    assert not thread.is_cancelled()
+    thread.cancel()
+    assert thread.is_cancelled()
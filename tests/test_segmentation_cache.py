@@ -0,0 +1,64 @@
+import numpy as np
+from app.utils.segmentation_cache import SegmentationCache, hash_file
+
+
+def test_cache_round_trip(tmp_path):
+    "Test storing and loading a label map with its class frequencies."
+
+    cache = SegmentationCache("model@1", directory=tmp_path)
+    labels = np.arange(12, dtype=np.uint8).reshape(3, 4) % 9
+    key = cache.key("abc", {"crf": {"iterations": 5}})
+
+    assert cache.get(key) is None
+    cache.put(key, labels, [0.25] * 8)
+
+    cached = cache.get(key)
+    assert cached.label_freq == [0.25] * 8
+    assert np.array_equal(cached.labels, labels)
+    assert cache.get(key, load_labels=False).labels is None
+
+
+def test_cache_key_depends_on_settings(tmp_path):
+    "Test that the same image segmented with different settings gets different keys."
+
+    cache = SegmentationCache("model@1", directory=tmp_path)
+    assert cache.key("abc", {"iterations": 5}) != cache.key("abc", {"iterations": 10})
+    assert cache.key("abc", {"a": 1, "b": 2}) == cache.key("abc", {"b": 2, "a": 1})
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    "Test that the oldest entries are removed once the size limit is exceeded."
+
+    rng = np.random.default_rng(0)
+    cache = SegmentationCache("model@1", directory=tmp_path, max_bytes=10 ** 9)
+    for name in ["a", "b", "c"]:
+        cache.put(name, rng.integers(0, 9, size=(64, 64), dtype=np.uint8), [0.0] * 8)
+    entry_size = (tmp_path / "a.npz").stat().st_size
+
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.get("a")
+    cache.put("d", rng.integers(0, 9, size=(64, 64), dtype=np.uint8), [0.0] * 8)
+
+    assert cache.get("b") is None
+    assert cache.get("d") is not None
+
+
+def test_cache_cleared_when_model_changes(tmp_path):
+    "Test that opening the cache with a new model fingerprint invalidates old entries."
+
+    cache = SegmentationCache("model@1", directory=tmp_path)
+    cache.put("key", np.zeros((2, 2), dtype=np.uint8), [0.0] * 8)
+
+    assert SegmentationCache("model@1", directory=tmp_path).get("key") is not None
+    assert SegmentationCache("model@2", directory=tmp_path).get("key") is None
+
+
+def test_hash_file_depends_on_content(tmp_path):
+    "Test that identical files share a hash and different files do not."
+
+    (tmp_path / "a.png").write_bytes(b"image")
+    (tmp_path / "b.png").write_bytes(b"image")
+    (tmp_path / "c.png").write_bytes(b"other")
+
+    assert hash_file(tmp_path / "a.png") == hash_file(tmp_path / "b.png")
+    assert hash_file(tmp_path / "a.png") != hash_file(tmp_path / "c.png")
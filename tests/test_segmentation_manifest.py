@@ -0,0 +1,76 @@
+import os
+from unittest.mock import MagicMock
+from app.utils.segmentation_cache import hash_file
+from app.utils.segmentation_manifest import SegmentationManifest, settings_digest
+
+
+def write_image(path, content, mtime_ns=None):
+    path.write_bytes(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_manifest_detects_new_and_changed_images(tmp_path):
+    "Test that only new, modified or differently configured images are reported as out of date."
+
+    image = write_image(tmp_path / "a.png", b"first", mtime_ns=1_000_000_000)
+    digest = settings_digest({"engine": "guided"})
+    manifest = SegmentationManifest(tmp_path)
+
+    assert not manifest.is_current(image, digest, hash_file)
+    manifest.record(image, hash_file(image), digest)
+    manifest.save()
+
+    manifest = SegmentationManifest(tmp_path)
+    assert manifest.is_current(image, digest, hash_file)
+    assert not manifest.is_current(image, settings_digest({"engine": "densecrf"}), hash_file)
+
+    write_image(tmp_path / "a.png", b"other", mtime_ns=2_000_000_000)
+    assert not manifest.is_current(image, digest, hash_file)
+
+
+def test_manifest_only_hashes_touched_images(tmp_path):
+    "Test that an image whose mtime changed but content did not is still up to date."
+
+    image = write_image(tmp_path / "a.png", b"first", mtime_ns=1_000_000_000)
+    digest = settings_digest({})
+    manifest = SegmentationManifest(tmp_path)
+    manifest.record(image, hash_file(image), digest)
+
+    hasher = MagicMock(side_effect=hash_file)
+    assert manifest.is_current(image, digest, hasher)
+    hasher.assert_not_called()
+
+    os.utime(image, ns=(3_000_000_000, 3_000_000_000))
+    assert manifest.is_current(image, digest, hasher)
+    hasher.assert_called_once()
+
+
+def test_manifest_prunes_removed_images(tmp_path):
+    "Test that images removed from the dataset are dropped from the manifest."
+
+    kept = write_image(tmp_path / "a.png", b"a")
+    removed = write_image(tmp_path / "b.png", b"b")
+    manifest = SegmentationManifest(tmp_path)
+    manifest.record(kept, hash_file(kept), "x")
+    manifest.record(removed, hash_file(removed), "x")
+
+    manifest.prune([kept])
+    manifest.save()
+
+    assert set(SegmentationManifest(tmp_path).entries) == {"a.png"}
+
+
+def test_manifest_written_for_matches_content_and_settings(tmp_path):
+    "Test that outputs only count as written for an image with the recorded hash and settings."
+
+    image = write_image(tmp_path / "a.png", b"first")
+    digest = settings_digest({"engine": "guided"})
+    manifest = SegmentationManifest(tmp_path)
+    assert not manifest.written_for(image, hash_file(image), digest)
+
+    manifest.record(image, hash_file(image), digest)
+    assert manifest.written_for(image, hash_file(image), digest)
+    assert not manifest.written_for(image, "other-hash", digest)
+    assert not manifest.written_for(image, hash_file(image), settings_digest({"engine": "densecrf"}))